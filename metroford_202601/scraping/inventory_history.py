@@ -0,0 +1,277 @@
+"""
+Inventory history as periodic full snapshots plus per-run change records.
+
+Every run used to append the whole inventory to inventory_history.json, so
+each unchanged vehicle was stored again on every run. Instead:
+
+    history/manifest.json                          index of the files below
+    history/snapshots/<YYYYMMDDTHHMMSS>.json.gz    full inventory at a point in time
+    history/deltas/<YYYYMMDDTHHMMSS>.json.gz       one run's changes (New / <field> change / Removed)
+    history/deltas/<first>-<last>.json.gz          deltas of one snapshot period, packed by the compactor
+
+- A run writes only its change records, so daily writes scale with churn
+- Every SNAPSHOT_INTERVAL_DAYS the compactor replays the deltas onto the
+  latest snapshot, writes the result as a new snapshot and packs that
+  period's per-run deltas into one file
+- The inventory on any date is the latest snapshot before it plus the
+  deltas after it (`inventory_as_of`)
+
+The legacy inventory_history.json is converted once (first run becomes the
+snapshot, later runs become deltas) and left in place.
+
+    python inventory_history.py --compact               # compact now
+    python inventory_history.py --as-of 2026-02-01      # inventory on a date
+"""
+
+import gzip
+import json
+import argparse
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+HISTORY_PREFIX = 'history'
+MANIFEST_FILE = f'{HISTORY_PREFIX}/manifest.json'
+LEGACY_HISTORY_FILE = 'inventory_history.json'
+
+SNAPSHOT_INTERVAL_DAYS = 7
+
+SNAPSHOT_COLS = ['Date', 'Make', 'Model', 'Trim', 'Year', 'Price', 'Description', 'Condition', 'VIN']
+DELTA_COLS = SNAPSHOT_COLS + ['Status', 'Changed Fields']
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def run_stamp(run_time: str) -> str:
+    return datetime.strptime(run_time, DATE_FORMAT).strftime('%Y%m%dT%H%M%S')
+
+
+def read_json(bucket, path: str):
+    data = bucket.blob(path).download_as_bytes(raw_download=True)
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+def write_json(bucket, path: str, payload: str, compress: bool = True):
+    """Upload a JSON string, gzip-compressed unless `compress` is False."""
+    blob = bucket.blob(path)
+    if compress:
+        blob.content_encoding = 'gzip'
+        blob.upload_from_string(gzip.compress(payload.encode('utf-8'), mtime=0), content_type='application/json')
+    else:
+        blob.upload_from_string(payload, content_type='application/json')
+
+
+def read_frame(bucket, path: str, columns: list) -> pd.DataFrame:
+    return pd.DataFrame(read_json(bucket, path), columns=columns)
+
+
+# ---------------------- MANIFEST ----------------------
+
+def empty_manifest() -> dict:
+    return {'snapshots': [], 'deltas': []}
+
+
+def load_manifest(bucket) -> dict:
+    """The history manifest; converts the legacy history file on first use."""
+    if bucket.blob(MANIFEST_FILE).exists():
+        return read_json(bucket, MANIFEST_FILE)
+
+    manifest = empty_manifest()
+    if bucket.blob(LEGACY_HISTORY_FILE).exists():
+        migrate_legacy(bucket, manifest)
+    return manifest
+
+
+def save_manifest(bucket, manifest: dict):
+    write_json(bucket, MANIFEST_FILE, json.dumps(manifest, indent=2), compress=False)
+
+
+# ---------------------- WRITE ----------------------
+
+def write_snapshot(bucket, manifest: dict, inventory: pd.DataFrame, run_time: str):
+    path = f'{HISTORY_PREFIX}/snapshots/{run_stamp(run_time)}.json.gz'
+    snapshot = inventory.reindex(columns=SNAPSHOT_COLS).assign(Date=run_time)
+
+    write_json(bucket, path, snapshot.to_json(orient='records'))
+    manifest['snapshots'].append({'date': run_time, 'path': path, 'rows': len(snapshot)})
+
+
+def write_delta(bucket, manifest: dict, changes: pd.DataFrame, run_time: str):
+    path = f'{HISTORY_PREFIX}/deltas/{run_stamp(run_time)}.json.gz'
+    delta = changes.reindex(columns=DELTA_COLS).assign(Date=run_time)
+
+    write_json(bucket, path, delta.to_json(orient='records'))
+    manifest['deltas'].append({'first': run_time, 'last': run_time, 'path': path, 'rows': len(delta)})
+
+
+def save_run(bucket, inventory: pd.DataFrame, changes: pd.DataFrame, run_time: str) -> dict:
+    """
+    Record one run:
+    - first run ever: today's inventory becomes the first snapshot
+    - otherwise: today's change records become a delta (nothing if no changes)
+    - compact if the latest snapshot is SNAPSHOT_INTERVAL_DAYS old
+    """
+    manifest = load_manifest(bucket)
+
+    if not manifest['snapshots']:
+        write_snapshot(bucket, manifest, inventory, run_time)
+    elif not changes.empty:
+        write_delta(bucket, manifest, changes, run_time)
+
+    replaced = []
+    if compaction_due(manifest, run_time):
+        replaced = compact(bucket, manifest, run_time)
+
+    save_manifest(bucket, manifest)
+    delete_files(bucket, replaced)
+
+    return manifest
+
+
+# ---------------------- READ ----------------------
+
+def replay(snapshot: pd.DataFrame, deltas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply change records (in run order) to a snapshot.
+    Each vehicle's last record wins; vehicles last recorded as Removed drop out.
+    """
+    combined = pd.concat([snapshot.reindex(columns=DELTA_COLS), deltas.reindex(columns=DELTA_COLS)], ignore_index=True)
+    combined = combined.sort_values('Date', kind='stable').drop_duplicates(subset='VIN', keep='last')
+
+    return combined[combined['Status'] != 'Removed'][SNAPSHOT_COLS].reset_index(drop=True)
+
+
+def load_deltas(bucket, manifest: dict, after: str, until: str) -> pd.DataFrame:
+    """Change records of runs in (after, until]."""
+    frames = [
+        read_frame(bucket, d['path'], DELTA_COLS)
+        for d in manifest['deltas']
+        if d['last'] > after and d['first'] <= until
+    ]
+    if not frames:
+        return pd.DataFrame(columns=DELTA_COLS)
+
+    deltas = pd.concat(frames, ignore_index=True)
+
+    return deltas[(deltas['Date'] > after) & (deltas['Date'] <= until)]
+
+
+def inventory_as_of(bucket, manifest: dict, when: str) -> pd.DataFrame:
+    """
+    Inventory at `when` ('YYYY-MM-DD HH:MM:SS', or a date for end of that day):
+    the latest snapshot at or before it plus the deltas since.
+    """
+    if len(when) == 10:
+        when = f'{when} 23:59:59'
+
+    snapshots = [s for s in manifest['snapshots'] if s['date'] <= when]
+    if not snapshots:
+        return pd.DataFrame(columns=SNAPSHOT_COLS)
+
+    base = snapshots[-1]
+    snapshot = read_frame(bucket, base['path'], SNAPSHOT_COLS)
+
+    return replay(snapshot, load_deltas(bucket, manifest, base['date'], when))
+
+
+# ---------------------- COMPACT ----------------------
+
+def compaction_due(manifest: dict, run_time: str) -> bool:
+    if not manifest['snapshots']:
+        return False
+    latest = datetime.strptime(manifest['snapshots'][-1]['date'], DATE_FORMAT)
+    return datetime.strptime(run_time, DATE_FORMAT) - latest >= timedelta(days=SNAPSHOT_INTERVAL_DAYS)
+
+
+def compact(bucket, manifest: dict, run_time: str) -> list:
+    """
+    Roll the deltas since the latest snapshot into a new snapshot at `run_time`,
+    and pack that period's per-run delta files into one.
+    Returns the paths of the packed per-run files. They are still listed by the
+    stored manifest, so delete them (`delete_files`) only after saving this one.
+    """
+    since = manifest['snapshots'][-1]['date']
+    inventory = inventory_as_of(bucket, manifest, run_time)
+    write_snapshot(bucket, manifest, inventory, run_time)
+
+    period = [d for d in manifest['deltas'] if d['first'] > since and d['last'] <= run_time]
+    replaced = []
+    if len(period) > 1:
+        packed = pd.concat([read_frame(bucket, d['path'], DELTA_COLS) for d in period], ignore_index=True)
+        first, last = period[0]['first'], period[-1]['last']
+        path = f'{HISTORY_PREFIX}/deltas/{run_stamp(first)}-{run_stamp(last)}.json.gz'
+        write_json(bucket, path, packed.to_json(orient='records'))
+
+        manifest['deltas'] = (
+            [d for d in manifest['deltas'] if d not in period]
+            + [{'first': first, 'last': last, 'path': path, 'rows': len(packed)}]
+        )
+        manifest['deltas'].sort(key=lambda d: d['first'])
+        replaced = [d['path'] for d in period]
+
+    print(f"Compacted history: snapshot of {len(inventory)} vehicles at {run_time}, "
+          f"{len(period)} deltas packed")
+
+    return replaced
+
+
+def delete_files(bucket, paths: list):
+    """Delete delta files a saved manifest no longer lists."""
+    for path in paths:
+        bucket.blob(path).delete()
+
+
+# ---------------------- MIGRATION ----------------------
+
+def migrate_legacy(bucket, manifest: dict):
+    """
+    Convert inventory_history.json (a full inventory per run):
+    the first run becomes the snapshot, each later run a delta of its
+    flagged rows plus Removed records for vehicles gone since the run before.
+    """
+    history = pd.DataFrame(read_json(bucket, LEGACY_HISTORY_FILE)).reindex(columns=DELTA_COLS)
+    runs = sorted(history['Date'].dropna().unique())
+    if not runs:
+        return
+
+    print(f"Converting {LEGACY_HISTORY_FILE}: {len(history)} rows over {len(runs)} runs")
+
+    by_run = {run: rows for run, rows in history.groupby('Date')}
+    write_snapshot(bucket, manifest, by_run[runs[0]], runs[0])
+
+    for previous_run, run in zip(runs, runs[1:]):
+        previous, current = by_run[previous_run], by_run[run]
+
+        gone = previous[~previous['VIN'].isin(current['VIN'])].assign(Status='Removed')
+        changes = pd.concat([current[current['Status'].notna()], gone], ignore_index=True)
+
+        if not changes.empty:
+            write_delta(bucket, manifest, changes, run)
+
+
+if __name__ == '__main__':
+    import main
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--compact', action='store_true', help='roll deltas into a new snapshot now')
+    parser.add_argument('--as-of', help='print the inventory at this date/time')
+    args = parser.parse_args()
+
+    main.start_run()
+    bucket = main.get_bucket()
+    manifest = load_manifest(bucket)
+
+    replaced = []
+    if args.compact and manifest['snapshots']:
+        replaced = compact(bucket, manifest, main.FORMATTED_NOW)
+
+    # Also persists a just-converted legacy history
+    save_manifest(bucket, manifest)
+    delete_files(bucket, replaced)
+
+    if args.as_of:
+        print(inventory_as_of(bucket, manifest, args.as_of))
+
+    print(f"{len(manifest['snapshots'])} snapshots, {len(manifest['deltas'])} delta files")
@@ -3,27 +3,95 @@ import pandas as pd
 import json
 from datetime import datetime, timedelta
 import numpy as np
-from google.cloud import storage
-import pytz
+from concurrent.futures import ThreadPoolExecutor
 
-tz = pytz.timezone('Australia/Sydney')
-NOW = datetime.now(tz)
-FORMATTED_NOW = NOW.strftime("%Y-%m-%d %H:%M:%S")
+import inventory_history
 
-# Show all columns when printing
-pd.set_option('display.max_columns', None)
+# Set per run by start_run (not at import, so warm instances don't reuse a stale time)
+NOW = None
+FORMATTED_NOW = None
 
-# Optional: widen the display so it doesn’t wrap
-pd.set_option('display.width', 500)
+# Shared storage bucket, created on first use and kept warm across invocations
+bucket = None
+
+# Pooled HTTP session for the stocklist API, created on first use
+session = None
 
 # Define the columns you expect
 expected_cols = ['Date', 'Make', 'Model', 'Trim', 'Year', 'Price', 'Description', 'Condition', 'VIN']
 
+STOCKLIST_URL = "https://cloud.inventorysearch.com.au/api/json/search/stocklist/"
+
+STOCKLIST_PARAMS = {
+    "filtercode": "metroford.com.au_all_stock",
+    "baseURL": "https%3A%2F%2Fwww.metroford.com.au%2Fall-stock",
+    "settingsHash": "302BE3545D7EDED3187382B9759511C1",
+}
+
+# Items requested per page; lowered to whatever the API actually returns,
+# and halved for a page that keeps failing (down to MIN_PAGE_SIZE)
+PAGE_SIZE = 200
+MIN_PAGE_SIZE = 25
+
+# Concurrent page requests, and retries per request (with backoff) on connection errors / 429 / 5xx
+PAGE_WORKERS = 4
+PAGE_RETRIES = 3
+REQUEST_TIMEOUT = 30
+
+# Response fields that may carry the total number of vehicles
+TOTAL_COUNT_KEYS = ['TotalCount', 'totalCount', 'Total', 'total', 'TotalResults', 'totalResults', 'Count', 'count']
+
+# Vehicles allowed to go missing between pages (stock selling mid-scrape) before a run fails
+VIN_COUNT_TOLERANCE = 2
+
+# Fields compared between runs, in Status priority order.
+# Bit i of 'Changed Fields' is set when CHANGE_COLS[i] changed.
+CHANGE_COLS = ['Price', 'Description', 'Condition', 'Trim']
+
+
+def get_bucket():
+    global bucket
+    if bucket is None:
+        from google.cloud import storage
+        bucket = storage.Client().bucket('metroford')
+    return bucket
+
+
+def get_session():
+    global session
+    if session is None:
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=PAGE_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET'],
+        )
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=PAGE_WORKERS, max_retries=retry))
+    return session
+
+
+def start_run():
+    """Stamp this run with the current Sydney time and set print options for the logs."""
+    global NOW, FORMATTED_NOW
+    import pytz
+
+    NOW = datetime.now(pytz.timezone('Australia/Sydney'))
+    FORMATTED_NOW = NOW.strftime("%Y-%m-%d %H:%M:%S")
+
+    # Show all columns when printing
+    pd.set_option('display.max_columns', None)
+
+    # Optional: widen the display so it doesn’t wrap
+    pd.set_option('display.width', 500)
+
 
 def save_current(df):
 
-    client = storage.Client()
-    bucket = client.bucket('metroford')
+    bucket = get_bucket()
     blob = bucket.blob('inventory_current.json')
 
     blob.upload_from_string(
@@ -33,8 +101,7 @@ def save_current(df):
 
 def save_removed(removed_df):
 
-    client = storage.Client()
-    bucket = client.bucket('metroford')
+    bucket = get_bucket()
     blob = bucket.blob('inventory_removed.json')
 
     if blob.exists():
@@ -57,8 +124,7 @@ def save_changes(changed_df):
     changed_df = changed_df.replace({np.nan: None})
     changed_dict = changed_df.to_dict(orient='records')
 
-    client = storage.Client()
-    bucket = client.bucket('metroford')
+    bucket = get_bucket()
     blob = bucket.blob('change_history.json')
 
     # Append today's changed records to history
@@ -76,34 +142,12 @@ def save_changes(changed_df):
     )
 
 
-def save_history(df):
-
-    client = storage.Client()
-    bucket = client.bucket('metroford')
-    blob = bucket.blob('inventory_history.json')
-
-    if blob.exists():
-        content = blob.download_as_text()
-        history_data = json.loads(content)
-    else:
-        history_data = []
-
-    output_cols = ['Date', 'Make', 'Model', 'Trim', 
-        'Year', 'Price', 'Description', 
-        'Condition', 'VIN', 'Status']
-
-    history_df = pd.DataFrame(history_data, columns=output_cols)
-
-    history_df = pd.concat([df, history_df], axis=0, ignore_index=True)
-
-    blob.upload_from_string(
-        json.dumps(history_df.replace({np.nan: None}).to_dict(orient='records'), indent=2),
-        content_type = 'application/json'
-    )
+def save_history(df, changed_df):
+    """Record today's changes as a delta; full snapshots only on the compaction schedule."""
+    inventory_history.save_run(get_bucket(), df, changed_df, FORMATTED_NOW)
 
 def save_summary(df):
-    client = storage.Client()
-    bucket = client.bucket('metroford')
+    bucket = get_bucket()
     blob = bucket.blob('summary_data.json')
 
     blob.upload_from_string(
@@ -111,26 +155,79 @@ def save_summary(df):
         content_type='application/json'
     )
 
-def get_payload():
-    url = "https://cloud.inventorysearch.com.au/api/json/search/stocklist/"
+def fetch_page(page, limit):
+    """One page of the stocklist: (items, reported total or None)."""
+    resp = get_session().get(
+        STOCKLIST_URL,
+        params={**STOCKLIST_PARAMS, "page": page, "limit": limit},
+        timeout=REQUEST_TIMEOUT
+    )
+    resp.raise_for_status()
+    data = resp.json()
 
-    params = {
-        "filtercode": "metroford.com.au_all_stock",
-        "baseURL": "https%3A%2F%2Fwww.metroford.com.au%2Fall-stock",
-        "settingsHash": "302BE3545D7EDED3187382B9759511C1",
-        "page": 1,
-        "limit": 110
-    }
+    total = next((data[k] for k in TOTAL_COUNT_KEYS if isinstance(data.get(k), int)), None)
+
+    return data['items'], total
+
+
+def fetch_range(page, limit):
+    """
+    Items of `page` at `limit` per page.
+    If the request still fails after the session's retries, the same range is
+    fetched as two half-size pages.
+    """
+    try:
+        return fetch_page(page, limit)[0]
+    except (requests.RequestException, ValueError) as e:
+        if limit % 2 or limit // 2 < MIN_PAGE_SIZE:
+            raise
+        print(f'Page {page} (limit {limit}) failed, splitting: {e}')
+        half = limit // 2
+        return fetch_range(2 * page - 1, half) + fetch_range(2 * page, half)
+
+
+def fetch_all_items():
+    """
+    Every vehicle in the stocklist.
+    - Page 1 gives the reported total and the API's effective page size
+    - Remaining pages are fetched concurrently (PAGE_WORKERS at a time)
+    - Without a reported total, pages are read in order until a short page
+    """
+    items, total = fetch_page(1, PAGE_SIZE)
+
+    if total is None:
+        # Page 1's size is the API's effective page size
+        print('Stocklist total not reported, paging until a short page')
+        limit = len(items)
+        page = 1
+        while limit and len(items) == page * limit:
+            page += 1
+            items += fetch_range(page, limit)
+        return items, len(items)
+
+    # The API may cap the page size below what was asked for
+    limit = PAGE_SIZE
+    if len(items) < min(PAGE_SIZE, total):
+        limit = len(items)
+
+    n_pages = -(-total // limit) if limit else 1
+    print(f'Stocklist reports {total} vehicles: {n_pages} pages of {limit}')
+
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+        for page_items in executor.map(lambda page: fetch_range(page, limit), range(2, n_pages + 1)):
+            items += page_items
+
+    return items, total
 
 
-    resp = requests.get(url, params=params)
-    data = resp.json()
+def get_payload():
+    items, total = fetch_all_items()
 
-    items = []
-    for item in data['items']:
+    rows = []
+    for item in items:
         details = item['Details']
 
-        items.append({
+        rows.append({
             'Date': FORMATTED_NOW,
             'Make': details.get('Manufacturer'),
             'Model': details.get('Model'),
@@ -141,19 +238,55 @@ def get_payload():
             'Condition': details.get('Condition'),
             'VIN': details.get('VIN')
         })
-        
 
-    # with open('inventory_current.json', 'w') as f:
-    #     json.dump(items, f, indent=2)
+    df = pd.DataFrame(rows, columns=expected_cols)
+
+    # Stock moving between pages mid-scrape can repeat a vehicle
+    df = df[~df['VIN'].duplicated() | df['VIN'].isna()].reset_index(drop=True)
 
-    df = pd.DataFrame(items)
+    # A short scrape would mark the missing vehicles as Removed, so fail instead
+    n_vins = df['VIN'].nunique()
+    if n_vins < total - VIN_COUNT_TOLERANCE:
+        raise RuntimeError(f'Scraped {n_vins} VINs but the stocklist reports {total} vehicles')
+    if n_vins != total:
+        print(f'Warning: scraped {n_vins} VINs, stocklist reports {total} vehicles')
 
     return df
 
+def classify_changes(merged_df, change_cols=CHANGE_COLS):
+    """
+    Vectorized Status and 'Changed Fields' for an outer-merged (_new/_old) frame.
+    - Status: 'Removed', 'New', '<field> change' for the first changed field
+      in `change_cols` order, else NaN
+    - Changed Fields: bitmask of every changed field (bit i = change_cols[i])
+    A field changed when the values differ; two missing values are equal.
+    """
+    removed = merged_df['Date_new'].isna().to_numpy()
+    new = merged_df['Date_old'].isna().to_numpy()
+    kept = ~removed & ~new
+
+    field_masks = []
+    bits = np.zeros(len(merged_df), dtype=np.uint8)
+    for i, col in enumerate(change_cols):
+        col_new = merged_df[f'{col}_new']
+        col_old = merged_df[f'{col}_old']
+        differ = ((col_new != col_old) & ~(col_new.isna() & col_old.isna())).to_numpy() & kept
+        field_masks.append(differ)
+        bits |= differ.astype(np.uint8) << i
+
+    merged_df['Status'] = np.select(
+        [removed, new] + field_masks,
+        ['Removed', 'New'] + [f'{col} change' for col in change_cols],
+        default=None
+    )
+    merged_df['Changed Fields'] = bits
+
+    return merged_df
+
+
 def change_detection(df):
 
-    client = storage.Client()
-    bucket = client.bucket('metroford')
+    bucket = get_bucket()
     blob = bucket.blob('inventory_current.json')
 
     # import data for the previous run
@@ -182,15 +315,8 @@ def change_detection(df):
 
     # change detection: removed (if vin is in previous scrape but not fresh scrape)
     # new (if vin is in fresh scrape but not previous scrape)
-    # price change (if price is different between previous scrape and fresh scrape)
-    merged_df['Status'] = merged_df.apply(
-        lambda x: 'Removed' if pd.isna(x['Date_new'])
-            else 'New' if pd.isna(x['Date_old'])
-                else 'Price change' if pd.notna(x['Price_old']) 
-                                    and pd.notna(x['Price_new']) 
-                                    and x['Price_old'] != x['Price_new'] 
-                    else np.nan,
-        axis=1)
+    # '<field> change' (if a CHANGE_COLS field differs between previous scrape and fresh scrape)
+    merged_df = classify_changes(merged_df)
     
     print('df[df["VIN"] == "1FATP8LH6R5147468"]:')
     print(df[df['VIN'] == "1FATP8LH6R5147468"])
@@ -208,7 +334,7 @@ def change_detection(df):
         )
 
     # merged_df will contain the 'Removed' records too
-    merged_df = merged_df[base_cols + ['VIN', 'Status']]
+    merged_df = merged_df[base_cols + ['VIN', 'Status', 'Changed Fields']]
 
     print('Changes:')
     print(merged_df.groupby('Status')['VIN'].count())
@@ -240,8 +366,7 @@ def check_history_changes(df):
     print('Running check_history_changes')
     print(f'df shape: {df.shape}')
 
-    client = storage.Client()
-    bucket = client.bucket('metroford')
+    bucket = get_bucket()
     blob = bucket.blob('change_history.json')
 
     if blob.exists():
@@ -288,6 +413,8 @@ def summarise_data(df):
     return summary_df
 
 def main(request):
+    start_run()
+
     df = get_payload()
 
     # Testing
@@ -300,7 +427,7 @@ def main(request):
     summary_df = summarise_data(df)
 
     save_current(df)
-    save_history(df)
+    save_history(df, changed_df)
     if not removed_df.empty:
         save_removed(removed_df)
     if not changed_df.empty:
@@ -1,38 +1,180 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import requests
+import pydeck as pdk
 from google.cloud import storage
+from sklearn.neighbors import BallTree
+import re
 import json
+import gzip
+import time
+import threading
+from collections import namedtuple
 
 st.set_page_config(page_title="Op Shop Monitor", layout='wide')
 
-@st.cache_data(ttl=3600*6)
-def get_store_data():
-    client = storage.Client()
-    bucket = client.bucket('op-shop-data')
-    blob = bucket.blob('stores_current.json')
+# Mean Earth radius; BallTree haversine distances are in radians
+EARTH_RADIUS_KM = 6371.0088
 
-    if blob.exists():
-        records = json.loads(blob.download_as_text())
+# '-33.87, 151.21' style input
+LATLON_RE = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$')
+
+STORE_COLUMNS = ["Date", "Store", "StoreID", "Suburb", "Address", "Latitude", "Longitude", "Hours", 'LocationApproximate', 'change_in_last_7_days', 'Last Change Date', 'Last Columns Changed']
+
+# How often a rerun may trigger a background check for a newer stores_current.json
+REFRESH_INTERVAL_SECONDS = 60
+
+# Per-version caches (index, table) keep the current data version and the one
+# before it, for sessions still rendering the old snapshot during a refresh
+CACHED_DATA_VERSIONS = 2
+
+# One loaded version of stores_current.json
+StoreSnapshot = namedtuple('StoreSnapshot', ['df', 'generation', 'etag', 'updated'])
+
+
+def parse_store_data(data: bytes) -> pd.DataFrame:
+    # stores_current.json is gzip-compressed (older uploads are plain JSON)
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+
+    return pd.DataFrame(json.loads(data), columns=STORE_COLUMNS)
+
+
+# ---------------------- DATA LOADER ----------------------
+
+class StoreDataLoader:
+    """
+    Stale-while-revalidate loader for stores_current.json, shared by all sessions.
+    - get() returns the loaded snapshot immediately; only the very first call waits
+    - at most every REFRESH_INTERVAL_SECONDS, a background thread fetches the
+      blob's metadata and re-downloads only if its generation/ETag changed
+    - a failed refresh keeps serving the previous snapshot
+    """
+
+    def __init__(self, bucket_name: str = 'op-shop-data', blob_name: str = 'stores_current.json',
+                 interval: float = REFRESH_INTERVAL_SECONDS):
+        self.bucket = storage.Client().bucket(bucket_name)
+        self.blob_name = blob_name
+        self.interval = interval
+        self.snapshot = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.refreshing = False
+
+    def get(self) -> StoreSnapshot:
+        if self.snapshot is None:
+            with self.lock:
+                if self.snapshot is None:
+                    self.refresh()
+        elif time.monotonic() - self.checked_at >= self.interval:
+            self.refresh_in_background()
+
+        return self.snapshot
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Refreshing {self.blob_name} failed, serving the cached copy: {e}")
+        finally:
+            self.refreshing = False
+
+    def refresh(self):
+        """Re-download the blob if its generation/ETag differs from the loaded snapshot."""
+        blob = self.bucket.get_blob(self.blob_name)
+        self.checked_at = time.monotonic()
+
+        if blob is None:
+            if self.snapshot is None:
+                self.snapshot = StoreSnapshot(pd.DataFrame(columns=STORE_COLUMNS), None, None, None)
+            return
+
+        current = self.snapshot
+        if current is not None and (current.generation, current.etag) == (blob.generation, blob.etag):
+            return
+
+        # Pinned to the generation we just saw, so data and metadata match
+        data = blob.download_as_bytes(raw_download=True, if_generation_match=blob.generation)
+        self.snapshot = StoreSnapshot(parse_store_data(data), blob.generation, blob.etag, blob.updated)
+        print(f"Loaded {self.blob_name} generation {blob.generation}")
+
+
+@st.cache_resource
+def get_store_loader() -> StoreDataLoader:
+    return StoreDataLoader()
+
+
+# ---------------------- NEARBY SEARCH ----------------------
+
+@st.cache_resource(max_entries=CACHED_DATA_VERSIONS)
+def build_store_index(_store_df, data_version):
+    """
+    BallTree (haversine) over stores with coordinates, built once per data load.
+    `data_version` keys the cache; the frame itself is not hashed.
+    Returns (tree, frame row positions of the tree's points); the tree is None
+    when no store has coordinates.
+    """
+    coords = _store_df[['Latitude', 'Longitude']].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    rows = np.flatnonzero(~np.isnan(coords).any(axis=1))
+    if len(rows) == 0:
+        return None, rows
+
+    tree = BallTree(np.radians(coords[rows]), metric='haversine')
+
+    return tree, rows
+
+
+def nearest_stores(index, lat: float, lon: float, k: int = None, radius_km: float = None):
+    """
+    Row positions and distances (km) of the stores nearest to (lat, lon), closest first.
+    Either the `k` nearest or all within `radius_km`.
+    """
+    tree, rows = index
+    if tree is None:
+        return np.array([], dtype=int), np.array([])
+
+    point = np.radians([[lat, lon]])
+    if radius_km is not None:
+        ind, dist = tree.query_radius(point, r=radius_km / EARTH_RADIUS_KM, return_distance=True, sort_results=True)
     else:
-        records = []
-    
-    df = pd.DataFrame(records, columns=["Date", "Store", "StoreID", "Suburb", "Address", "Latitude", "Longitude", "Hours", 'change_in_last_7_days', 'Last Change Date', 'Last Columns Changed'])
+        dist, ind = tree.query(point, k=min(k, len(rows)))
+
+    return rows[ind[0]], dist[0] * EARTH_RADIUS_KM
 
-    return df
 
-store_df = get_store_data()
+@st.cache_data(ttl=3600*24)
+def locate_query(query: str):
+    """(lat, lon) for a 'lat, lon' string or an address/suburb (Nominatim), or None."""
+    m = LATLON_RE.match(query)
+    if m:
+        return float(m.group(1)), float(m.group(2))
 
-suburbs = store_df['Suburb'].dropna().unique()
-stores = store_df['Store'].dropna().unique()
+    response = requests.get(
+        'https://nominatim.openstreetmap.org/search',
+        params={'q': query, 'format': 'json', 'limit': 1, 'countrycodes': 'au'},
+        headers={'User-Agent': 'opshop_locator'},
+        timeout=10
+    )
+    response.raise_for_status()
+    results = response.json()
+    if not results:
+        return None
 
-if 'selected_suburbs' not in st.session_state:
-    st.session_state.selected_suburbs = sorted(suburbs)
+    return float(results[0]['lat']), float(results[0]['lon'])
 
-if 'selected_stores' not in st.session_state:
-    st.session_state.selected_stores = sorted(stores)
 
-if 'suburb_key' not in st.session_state:
-    st.session_state.suburb_key = 'default'
+store_data = get_store_loader().get()
+store_df = store_data.df
+store_index = build_store_index(store_df, store_data.generation)
 
 DF_COLUMNS = [
     'Store', 
@@ -46,43 +188,212 @@ DF_COLUMNS = [
     'Last Columns Changed'
 ]
 
+PAGE_SIZES = [25, 50, 100, 250]
+
+# State at the end of an address ('... Belconnen ACT 2617')
+ADDRESS_STATE_RE = r'(?i)\b(ACT|NSW|NT|QLD|SA|TAS|VIC|WA)\b\s*(?:\d{4})?\s*(?:,\s*Australia)?\s*$'
+
+CHAIN_COLOURS = {
+    'Salvos': [255, 0, 0],         # red
+    'Save The Children': [0, 0, 255]  # blue
+}
+OTHER_CHAIN_COLOUR = [128, 128, 128]  # grey
+
+# Above this many stores the map draws per-chain clusters instead of single stores
+MAP_POINT_LIMIT = 5000
+
+# Cluster cell size in degrees (~5 km) and the map radius of a single store
+CLUSTER_CELL_DEG = 0.05
+STORE_RADIUS_M = 500
+
+
+# ---------------------- TABLE ----------------------
+
+@st.cache_resource(max_entries=CACHED_DATA_VERSIONS)
+def prepare_store_table(_store_df, data_version):
+    """
+    Filter and map columns computed once per data load:
+    - State: parsed from the address
+    - changed: change_in_last_7_days as a real bool, the highlight mask
+    - lat/lon: float coordinates (older snapshots store them as strings)
+    - colour_r/g/b: the chain's map colour
+    - cell_x/cell_y: map cluster cell
+    """
+    lat = pd.to_numeric(_store_df['Latitude'], errors='coerce').astype('float32')
+    lon = pd.to_numeric(_store_df['Longitude'], errors='coerce').astype('float32')
+
+    # Palette row per chain; unknown chains (and factorize's -1 for missing) get the last row
+    codes, chains = pd.factorize(_store_df['Store'])
+    palette = np.array([CHAIN_COLOURS.get(c, OTHER_CHAIN_COLOUR) for c in chains] + [OTHER_CHAIN_COLOUR], dtype=np.uint8)
+    colours = palette[codes]
+
+    return _store_df.assign(
+        State=_store_df['Address'].fillna('').str.extract(ADDRESS_STATE_RE, expand=False).str.upper(),
+        changed=_store_df['change_in_last_7_days'].fillna(False).astype(bool),
+        lat=lat,
+        lon=lon,
+        colour_r=colours[:, 0],
+        colour_g=colours[:, 1],
+        colour_b=colours[:, 2],
+        cell_x=np.floor(lon / CLUSTER_CELL_DEG),
+        cell_y=np.floor(lat / CLUSTER_CELL_DEG),
+    )
+
+
+def filter_stores(df: pd.DataFrame, chains: list, states: list, suburbs: list, changed_only: bool) -> pd.DataFrame:
+    """Rows matching every active filter; an empty selection means no filter."""
+    mask = np.ones(len(df), dtype=bool)
+    if chains:
+        mask &= df['Store'].isin(chains).to_numpy()
+    if states:
+        mask &= df['State'].isin(states).to_numpy()
+    if suburbs:
+        mask &= df['Suburb'].isin(suburbs).to_numpy()
+    if changed_only:
+        mask &= df['changed'].to_numpy()
+
+    return df[mask]
+
+
+def page_of(df: pd.DataFrame, sort_by: str, ascending: bool, page: int, page_size: int) -> pd.DataFrame:
+    """One page of `df` sorted by `sort_by`; only the sort column is sorted, only the page is copied."""
+    order = df[sort_by].sort_values(ascending=ascending, kind='stable', na_position='last').index
+    start = (page - 1) * page_size
+
+    return df.loc[order[start:start + page_size]]
+
+
+def highlight_changes(page: pd.DataFrame, mask: np.ndarray) -> pd.DataFrame:
+    """CSS for a whole page at once: rows in `mask` yellow."""
+    colour = np.where(mask, 'background-color: yellow', '')
+
+    return pd.DataFrame(np.repeat(colour[:, None], page.shape[1], axis=1), index=page.index, columns=page.columns)
+
 
+# ---------------------- MAP ----------------------
 
-def highlight_changes(row):
-    color = ''
-    if row['change_in_last_7_days']:
-        color = 'background-color: yellow'
-    return [color] * len(row)
+def store_map(df: pd.DataFrame) -> pdk.Deck:
+    """
+    Map of the stores in `df`, coloured by chain.
+    Up to MAP_POINT_LIMIT stores are drawn individually; beyond that, stores of
+    the same chain in a cluster cell are drawn as one point sized by count.
+    """
+    points = df[df['lat'].notna() & df['lon'].notna()]
+    colour_cols = ['colour_r', 'colour_g', 'colour_b']
+
+    if len(points) <= MAP_POINT_LIMIT:
+        layer_df = points[['Store', 'Suburb', 'Address', 'lat', 'lon'] + colour_cols].assign(stores=1, radius=STORE_RADIUS_M)
+        tooltip = {'text': '{Store}\n{Address}'}
+    else:
+        layer_df = (
+            points.groupby(['cell_x', 'cell_y', 'Store'], sort=False)
+            .agg(lat=('lat', 'mean'), lon=('lon', 'mean'), stores=('lat', 'size'),
+                 colour_r=('colour_r', 'first'), colour_g=('colour_g', 'first'), colour_b=('colour_b', 'first'))
+            .reset_index()
+        )
+        layer_df['radius'] = STORE_RADIUS_M * np.sqrt(layer_df['stores'])
+        tooltip = {'text': '{Store}: {stores} stores'}
+
+    layer = pdk.Layer(
+        'ScatterplotLayer',
+        data=layer_df,
+        get_position='[lon, lat]',
+        get_fill_color='[colour_r, colour_g, colour_b, 180]',
+        get_radius='radius',
+        radius_min_pixels=3,
+        radius_max_pixels=40,
+        pickable=True,
+    )
+
+    return pdk.Deck(
+        layers=[layer],
+        initial_view_state=pdk.ViewState(latitude=-28.0, longitude=134.0, zoom=3.3),
+        tooltip=tooltip,
+    )
 
 st.title("Op-Shop and Charity Stores Australia")
 
+if store_data.updated is None:
+    st.caption("No store data published yet")
+else:
+    st.caption(f"Data as of {store_df['Date'].max()} (published {store_data.updated:%Y-%m-%d %H:%M} UTC)")
+
+st.markdown("### Stores Near Me")
+
+search_cols = st.columns([3, 1, 2])
+with search_cols[0]:
+    near_query = st.text_input("Address, suburb or lat, lon", placeholder="e.g. Fitzroy VIC or -37.80, 144.98")
+with search_cols[1]:
+    near_mode = st.radio("Search by", ['Nearest', 'Radius'])
+with search_cols[2]:
+    if near_mode == 'Nearest':
+        near_k = st.slider("Number of stores", 1, 50, 10)
+    else:
+        near_radius = st.slider("Radius (km)", 1, 100, 10)
+
+near_point = None
+if near_query:
+    try:
+        near_point = locate_query(near_query)
+    except requests.RequestException as e:
+        st.error(f"Could not look up '{near_query}': {e}")
+    else:
+        if near_point is None:
+            st.warning(f"No location found for '{near_query}'")
+
 st.markdown("### List of Stores")
 
+table_df = prepare_store_table(store_df, store_data.generation)
 
 cols = st.columns([1,3])
 with cols[0]:
-    st.metric("Total stores:",len(store_df))
-    st.metric("Stores with changes (7d):", store_df['change_in_last_7_days'].sum())
-    st.metric("% of stores changed (7d):", f"{round(store_df['change_in_last_7_days'].sum()/len(store_df)*100, 1)}%")    
+    st.metric("Total stores:",len(table_df))
+    st.metric("Stores with changes (7d):", table_df['changed'].sum())
+    st.metric("% of stores changed (7d):", f"{round(table_df['changed'].sum()/max(len(table_df), 1)*100, 1)}%")
 with cols[1]:
-    show_changes = st.checkbox("Show only stores with recent changes")
+    filter_cols = st.columns(4)
+    with filter_cols[0]:
+        selected_stores = st.multiselect("Chain", sorted(table_df['Store'].dropna().unique()))
+    with filter_cols[1]:
+        selected_states = st.multiselect("State", sorted(table_df['State'].dropna().unique()))
+    with filter_cols[2]:
+        suburb_options = table_df if not selected_states else table_df[table_df['State'].isin(selected_states)]
+        selected_suburbs = st.multiselect("Suburb", sorted(suburb_options['Suburb'].dropna().unique()))
+    with filter_cols[3]:
+        show_changes = st.checkbox("Show only stores with recent changes")
+
+columns = list(DF_COLUMNS)
+if near_point is not None:
+    if near_mode == 'Nearest':
+        near_rows, near_km = nearest_stores(store_index, *near_point, k=near_k)
+    else:
+        near_rows, near_km = nearest_stores(store_index, *near_point, radius_km=near_radius)
+    table_df = table_df.iloc[near_rows].assign(**{'Distance (km)': near_km.round(2)})
+    columns = ['Distance (km)'] + columns
+    with cols[1]:
+        st.caption(f"{len(table_df)} stores near {near_point[0]:.4f}, {near_point[1]:.4f}")
 
-if show_changes:
-    store_df = store_df[store_df["change_in_last_7_days"] == True]
+filtered_df = filter_stores(table_df, selected_stores, selected_states, selected_suburbs, show_changes)
 
 with cols[1]:
-    st.dataframe(store_df.style.apply(highlight_changes, axis=1))
+    page_cols = st.columns([2, 1, 1, 1])
+    with page_cols[0]:
+        sort_by = st.selectbox("Sort by", columns, index=0 if near_point is not None else columns.index('Suburb'))
+    with page_cols[1]:
+        descending = st.checkbox("Descending")
+    with page_cols[2]:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES)
+    n_pages = max(1, -(-len(filtered_df) // page_size))
+    with page_cols[3]:
+        page = min(int(st.number_input("Page", min_value=1, value=1, step=1)), n_pages)
+
+    page_df = page_of(filtered_df, sort_by, not descending, page, page_size)
+    first = (page - 1) * page_size
+    st.caption(f"Showing {min(first + 1, len(filtered_df))}-{first + len(page_df)} of {len(filtered_df)} stores (page {page} of {n_pages})")
+
+    shown = page_df[columns]
+    st.dataframe(shown.style.apply(highlight_changes, mask=page_df['changed'].to_numpy(), axis=None), hide_index=True)
 
 st.markdown("### Map of Stores")
 
-map_colours = {
-    'Salvos': [255, 0, 0],         # red
-    'Save The Children': [0, 0, 255]  # blue
-}
-map_df = store_df[['Latitude', 'Longitude', 'Store']].copy()
-map_df = map_df[~map_df['Latitude'].isin(['None']) & ~map_df['Longitude'].isin(['None'])]
-map_df['colour'] = map_df['Store'].apply(lambda x: map_colours[x])
-map_df = map_df.rename(columns={'Latitude': 'lat', 'Longitude': 'lon'})
-map_df['lat'] = map_df['lat'].astype(float)
-map_df['lon'] = map_df['lon'].astype(float)
-st.map(map_df, color='colour')
+st.pydeck_chart(store_map(filtered_df))
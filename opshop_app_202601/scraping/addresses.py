@@ -0,0 +1,183 @@
+"""
+Address normalization helpers for the op-shop scraper.
+
+`format_address` cleans a raw address for geocoding; `canonical_address_key`
+folds case, whitespace, punctuation and common street-type abbreviations so
+trivially different spellings of the same address map to one key (used by the
+geocode cache and for address-based store IDs).
+
+Both have batch versions (`format_addresses`, `canonical_address_keys`) that
+run the same precompiled patterns over a whole Series with pandas string
+methods instead of a Python loop per address.
+"""
+
+import re
+
+import pandas as pd
+
+# Abbreviation -> canonical word, applied to whole words after lower-casing
+ABBREVIATIONS = {
+    'cnr': 'corner of',
+    'st': 'street',
+    'rd': 'road',
+    'ave': 'avenue',
+    'av': 'avenue',
+    'hwy': 'highway',
+    'pde': 'parade',
+    'dr': 'drive',
+    'blvd': 'boulevard',
+    'cres': 'crescent',
+    'ct': 'court',
+    'pl': 'place',
+    'tce': 'terrace',
+    'prom': 'promenade',
+    'ln': 'lane',
+    'cl': 'close',
+    'esp': 'esplanade',
+    'sq': 'square',
+    'shp': 'shop',
+}
+
+ABBREVIATION_RE = re.compile(r'\b(' + '|'.join(ABBREVIATIONS) + r')\b\.?')
+BREAK_RE = re.compile(r'<br\s*/?>|[\r\n]+')
+PUNCT_RE = re.compile(r'[^\w\s,/&-]')
+SPACE_RE = re.compile(r'\s+')
+COMMA_RE = re.compile(r'\s*,[\s,]*')
+COUNTRY_RE = re.compile(r'(,\s*)?\baustralia$')
+
+# format_address patterns, applied in order, with a (lower-case) substring
+# every match contains; batch runs only apply a pattern to rows containing it
+FORMAT_PATTERNS = [
+    (re.compile(r'\r?\n\s*\((.*?)\)'), r', \1', '('),          # newline + parentheses
+    (re.compile(r'\s*\((.*?)\)'), r', \1', '('),                 # parentheses
+    (re.compile(r'\bCnr\b', re.IGNORECASE), 'Corner of', 'cnr'),  # Cnr -> Corner
+    (re.compile(r'^\d+/\s*'), '', '/'),                          # remove unit/shop prefixes
+    (re.compile(r',\s*,+'), ',', ','),                            # clean repeated commas
+]
+
+# Prefix of address-based store IDs (StoreID = prefix + canonical key)
+STC_ID_PREFIX = 'STC-'
+
+
+def _expand_abbreviation(m) -> str:
+    return ABBREVIATIONS[m.group(1)]
+
+
+# ---------------------- SINGLE ADDRESS ----------------------
+
+def format_address(addr: str) -> str:
+    """
+    Clean and standardize a raw address string.
+    - Expands Cnr -> Corner of
+    - Moves parenthesised parts into comma-separated components
+    - Removes unit/shop prefixes
+    - Ensures country is appended
+    """
+    if not addr:
+        return ''
+
+    for pattern, repl, _ in FORMAT_PATTERNS:
+        addr = pattern.sub(repl, addr)
+    addr = addr.strip(', ')
+
+    if 'Australia' not in addr:
+        addr += ', Australia'
+
+    return addr.strip()
+
+
+def canonical_address_key(addr: str) -> str:
+    """
+    Canonical cache key for an address.
+    - Lower-cases and folds whitespace, line breaks and stray punctuation
+    - Expands common abbreviations (St -> street, Cnr -> corner of, ...)
+    - Drops a trailing ', Australia'
+    """
+    if not addr:
+        return ''
+
+    key = BREAK_RE.sub(', ', addr.lower())
+    key = PUNCT_RE.sub(' ', key)
+    key = ABBREVIATION_RE.sub(_expand_abbreviation, key)
+    key = SPACE_RE.sub(' ', key)
+    key = COMMA_RE.sub(', ', key).strip(', ')
+    key = COUNTRY_RE.sub('', key).strip(', ')
+
+    return key
+
+
+# ---------------------- BATCH ----------------------
+
+def _replace(values: pd.Series, pattern, repl, rows: pd.Series = None) -> pd.Series:
+    """`values.str.replace(pattern, repl)`, restricted to `rows` (a boolean mask) if given."""
+    if rows is None:
+        return values.str.replace(pattern, repl, regex=True)
+
+    if not rows.any():
+        return values
+
+    values = values.copy()
+    values[rows] = values[rows].str.replace(pattern, repl, regex=True)
+
+    return values
+
+
+def _unique_map(func, values: pd.Series) -> pd.Series:
+    """Apply a batch function to the distinct values only and broadcast back."""
+    codes, uniques = pd.factorize(values.fillna('').astype(str))
+    result = func(pd.Series(uniques, dtype=object))
+
+    return pd.Series(result.to_numpy()[codes], index=values.index, dtype=object)
+
+
+def format_addresses(addrs: pd.Series) -> pd.Series:
+    """`format_address` over a Series; missing/empty addresses become ''."""
+    return _unique_map(_format_unique, addrs)
+
+
+def _format_unique(addrs: pd.Series) -> pd.Series:
+    empty = addrs == ''
+
+    for pattern, repl, guard in FORMAT_PATTERNS:
+        lowered = addrs.str.lower() if pattern.flags & re.IGNORECASE else addrs
+        addrs = _replace(addrs, pattern, repl, lowered.str.contains(guard, regex=False))
+    addrs = addrs.str.strip(', ')
+
+    no_country = ~addrs.str.contains('Australia', regex=False)
+    addrs = addrs.where(~no_country, addrs + ', Australia').str.strip()
+
+    return addrs.mask(empty, '')
+
+
+def canonical_address_keys(addrs: pd.Series) -> pd.Series:
+    """`canonical_address_key` over a Series; missing/empty addresses become ''."""
+    return _unique_map(_canonical_unique, addrs)
+
+
+def _canonical_unique(addrs: pd.Series) -> pd.Series:
+    keys = addrs.str.lower()
+    keys = _replace(keys, BREAK_RE, ', ', keys.str.contains(r'[<\r\n]', regex=True))
+    keys = _replace(keys, PUNCT_RE, ' ')
+    keys = _replace(keys, ABBREVIATION_RE, _expand_abbreviation)
+    keys = _replace(keys, SPACE_RE, ' ')
+    keys = _replace(keys, COMMA_RE, ', ', keys.str.contains(',', regex=False)).str.strip(', ')
+    keys = _replace(keys, COUNTRY_RE, '', keys.str.endswith('australia')).str.strip(', ')
+
+    return keys
+
+
+def canonical_store_ids(ids: pd.Series) -> pd.Series:
+    """
+    Re-key address-based store IDs ('STC-<address>') onto canonical address keys.
+    Idempotent, so it also migrates IDs written before keys were canonical.
+    Other IDs pass through unchanged.
+    """
+    ids = ids.astype(object)
+    address_based = ids.str.startswith(STC_ID_PREFIX, na=False)
+    if not address_based.any():
+        return ids
+
+    ids = ids.copy()
+    ids[address_based] = STC_ID_PREFIX + canonical_address_keys(ids[address_based].str[len(STC_ID_PREFIX):])
+
+    return ids
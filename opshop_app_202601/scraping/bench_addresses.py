@@ -0,0 +1,101 @@
+"""
+Benchmark: batch address normalization vs the per-address loop.
+
+Generates tens of thousands of raw addresses, each a random spelling variant
+(case, abbreviations, spacing, parentheses, unit prefixes) of a smaller set of
+base addresses, then:
+
+- times format_address + canonical_address_key in a Python loop against
+  format_addresses + canonical_address_keys over a Series, checking they agree
+- reports the geocode cache hit rate for today's spellings against a cache
+  filled from yesterday's, keyed on the formatted string vs the canonical key
+
+    python bench_addresses.py
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from addresses import format_address, canonical_address_key, format_addresses, canonical_address_keys
+
+SIZES = [20_000, 50_000]
+BASE_SHARE = 0.2
+
+STREETS = [('St', 'Street'), ('Rd', 'Road'), ('Ave', 'Avenue'), ('Pde', 'Parade'), ('Hwy', 'Highway')]
+STATES = ['NSW', 'VIC', 'QLD', 'SA', 'WA']
+
+
+def make_base(n: int, rng) -> list:
+    """(number, street name, street type index, suburb, state, postcode) per base address."""
+    return [
+        (int(rng.integers(1, 400)), f'Example{i % 997}', int(rng.integers(len(STREETS))),
+         f'Suburb {i % 1500}', STATES[i % len(STATES)], 2000 + i % 800)
+        for i in range(n)
+    ]
+
+
+def spell(base: tuple, rng) -> str:
+    """One raw spelling of a base address, as different scrapes return it."""
+    number, name, street, suburb, state, postcode = base
+    abbr, full = STREETS[street]
+
+    street_type = [abbr, abbr + '.', full, full.upper()][rng.integers(4)]
+    addr = f"{number} {name} {street_type}{',' if rng.random() < 0.5 else ''}  {suburb} {state} {postcode}"
+
+    if rng.random() < 0.3:
+        addr = addr.lower()
+    if rng.random() < 0.2:
+        addr = f"{rng.integers(1, 9)}/{addr}"
+    if rng.random() < 0.2:
+        addr = addr.replace(f'{suburb}', f'(Shop {number % 7 + 1})\n{suburb}', 1)
+    if rng.random() < 0.3:
+        addr += ', Australia'
+
+    return addr
+
+
+def time_it(func, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def loop_normalize(raw: list) -> tuple:
+    formatted = [format_address(a) for a in raw]
+    return formatted, [canonical_address_key(a) for a in formatted]
+
+
+def batch_normalize(raw: pd.Series) -> tuple:
+    formatted = format_addresses(raw)
+    return formatted, canonical_address_keys(formatted)
+
+
+def hit_rate(cached_keys, lookup_keys) -> float:
+    cached = set(cached_keys)
+    return float(np.mean([k in cached for k in lookup_keys]))
+
+
+if __name__ == '__main__':
+    for n in SIZES:
+        rng = np.random.default_rng(n)
+        base = make_base(int(n * BASE_SHARE), rng)
+
+        picks = rng.integers(len(base), size=n)
+        yesterday = [spell(base[i], rng) for i in picks]
+        today = [spell(base[i], rng) for i in picks]
+
+        (loop_fmt, loop_keys), loop_s = time_it(loop_normalize, today)
+        (batch_fmt, batch_keys), batch_s = time_it(batch_normalize, pd.Series(today, dtype=object))
+
+        assert list(batch_fmt) == loop_fmt
+        assert list(batch_keys) == loop_keys
+
+        yesterday_fmt, yesterday_keys = batch_normalize(pd.Series(yesterday, dtype=object))
+
+        print(f"{n} addresses ({len(base)} distinct places)")
+        print(f"  loop: {loop_s:7.3f}s | batch: {batch_s:7.3f}s | speedup: {loop_s / batch_s:5.1f}x")
+        print(f"  distinct formatted: {len(set(loop_fmt))} | distinct canonical keys: {len(set(loop_keys))}")
+        print(f"  cache hit rate vs yesterday: formatted key {hit_rate(yesterday_fmt, loop_fmt):6.1%} "
+              f"| canonical key {hit_rate(yesterday_keys, loop_keys):6.1%}")
@@ -0,0 +1,32 @@
+"""
+Benchmark: batch geocoding against the offline LocalGeocoder.
+
+Simulates a network round trip per lookup and compares a single worker with
+the worker pool, both under the same rate limit.
+
+    python bench_geocoding.py
+"""
+
+import time
+
+from geocoding import LocalGeocoder, batch_geocode
+
+N_ADDRESSES = 100
+LATENCY = 0.25
+RATE = 20.0
+
+
+if __name__ == '__main__':
+    addresses = [f'{i} Example Street, Suburb {i % 50}, Australia' for i in range(N_ADDRESSES)]
+
+    for workers in [1, 4, 8]:
+        geolocator = LocalGeocoder(latency=LATENCY)
+        cache = {}
+
+        start = time.perf_counter()
+        batch_geocode(addresses, cache, geolocator, workers=workers, rate=RATE)
+        elapsed = time.perf_counter() - start
+
+        assert len(cache) == N_ADDRESSES
+        print(f"workers: {workers} | lookups: {geolocator.calls} | {elapsed:6.2f}s "
+              f"(rate floor {N_ADDRESSES / RATE:.2f}s)")
@@ -0,0 +1,204 @@
+"""
+Synthetic-scale replay benchmark for the op-shop pipeline.
+
+For each store count, seeds a local storage stand-in with N days of synthetic
+history (with configurable hours/address churn), then replays one more day
+through the full `main(None, PayloadTesting=True, payload=...)` pipeline and
+reports its per-stage metrics and the size of the stored history.
+A first run against an empty bucket is replayed as well, as a check.
+
+    python bench_pipeline.py                       # 1k / 10k / 100k stores, 30 days
+    python bench_pipeline.py --sizes 1000 --days 90 --hours-churn 0.05
+"""
+
+import os
+import json
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# main.py picks its bucket at import time; point it at a scratch directory
+BENCH_ROOT = tempfile.mkdtemp(prefix='opshop_bench_')
+os.environ['OPSHOP_LOCAL_STORAGE'] = os.path.join(BENCH_ROOT, 'import')
+
+import main
+import history_store
+import history_intervals
+import change_index
+import change_detection
+import delta_feed
+from local_storage import LocalBucket
+from run_storage import RunStorage
+
+CHAINS = ['Salvos', 'Save The Children', 'Vinnies', 'Red Cross']
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+KEY_COLS = ['Store', 'StoreID', 'Suburb']
+
+
+# ---------------------- GENERATORS ----------------------
+
+def make_hours(rng, n: int) -> np.ndarray:
+    """Salvos-style hours text with a handful of distinct schedules."""
+    opens = rng.choice(['08:30:00', '09:00:00', '09:30:00', '10:00:00'], n)
+    closes = rng.choice(['16:00:00', '17:00:00', '17:30:00'], n)
+    sat_closes = rng.choice(['13:00:00', '16:00:00', '17:00:00'], n)
+
+    weekday = [', '.join(f"{d}: {o} to {c}" for d in DAYS[:5]) for o, c in zip(opens, closes)]
+    return np.array([f"{w}, Saturday: {o} to {s}, Sunday: Closed" for w, o, s in zip(weekday, opens, sat_closes)])
+
+
+def make_stores(n_stores: int, date: str, seed: int = 0) -> pd.DataFrame:
+    """Synthetic scrape with the pipeline's STORE_COLUMNS."""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(n_stores)
+
+    return pd.DataFrame({
+        'Date': date,
+        'Store': rng.choice(CHAINS, n_stores),
+        'StoreID': [f'S{i}' for i in ids],
+        'Suburb': [f'Suburb {i % 2000}' for i in ids],
+        'Address': [f'{i} Example Street<br>Suburb {i % 2000} NSW {2000 + i % 800}' for i in ids],
+        'Latitude': rng.uniform(-38, -12, n_stores).round(6).astype(str),
+        'Longitude': rng.uniform(114, 153, n_stores).round(6).astype(str),
+        'Hours': make_hours(rng, n_stores),
+    })
+
+
+def churn(stores: pd.DataFrame, date: str, rng, hours_churn: float, address_churn: float) -> pd.DataFrame:
+    """Next day's scrape: change hours/addresses of a random share of stores."""
+    stores = stores.copy()
+    stores['Date'] = date
+
+    hours_mask = rng.random(len(stores)) < hours_churn
+    stores.loc[hours_mask, 'Hours'] = make_hours(rng, int(hours_mask.sum()))
+
+    address_mask = rng.random(len(stores)) < address_churn
+    stores.loc[address_mask, 'Address'] = 'Shop ' + pd.Series(rng.integers(1, 50, int(address_mask.sum())).astype(str), index=stores.index[address_mask]) + ', ' + stores.loc[address_mask, 'Address']
+
+    return stores
+
+
+def diff_day(today: pd.DataFrame, previous: pd.DataFrame) -> pd.DataFrame:
+    """change_flag / columns_changed for a synthetic day, using the pipeline's diff engine."""
+    merged = today.merge(previous, on=KEY_COLS, how='left', suffixes=('_new', '_old'))
+    merged = change_detection.detect_changes(merged)
+
+    result = merged[[c for c in merged.columns if not c.endswith('_old')]]
+    return result.rename(columns={c: c[:-4] for c in result.columns if c.endswith('_new')})
+
+
+def seed_history(store: RunStorage, n_stores: int, days: int, hours_churn: float, address_churn: float,
+                 seed: int = 0) -> pd.DataFrame:
+    """
+    Write `days` daily history partitions, the interval table, the change index
+    and stores_current.json.
+    Returns the last day's scrape (the 'previous run' for the replay).
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=days)
+
+    stores = make_stores(n_stores, f"{start:%Y-%m-%d %H:%M:%S}", seed)
+    previous = stores
+    manifest = {'partitions': []}
+    index = change_index.build_change_index(pd.DataFrame())
+    intervals = history_intervals.update_intervals(history_intervals.empty_intervals(), previous, previous['Date'].iloc[0])
+
+    for day in range(days):
+        run_time = start + timedelta(days=day)
+        stores = churn(previous, f"{run_time:%Y-%m-%d %H:%M:%S}", rng, hours_churn, address_churn)
+        day_df = diff_day(stores, previous)
+
+        history_store.write_partition(store, day_df[day_df['change_flag'] == True], run_time, manifest=manifest,
+                                      changes_only=True, save=False)
+        intervals = history_intervals.update_intervals(intervals, day_df, day_df['Date'].iloc[0])
+        change_index.update_change_index(index, day_df)
+        previous = stores
+
+    history_store.save_manifest(store, manifest)
+    history_intervals.save_intervals(store, intervals)
+    change_index.save_change_index(store, index)
+    store.write_json('stores_current.json', day_df.to_json(orient='records'))
+
+    return previous
+
+
+# ---------------------- BENCHMARK ----------------------
+
+def run_benchmark(n_stores: int, days: int, hours_churn: float, address_churn: float) -> dict:
+    bucket = LocalBucket(os.path.join(BENCH_ROOT, f'stores_{n_stores}'))
+    previous = seed_history(RunStorage(bucket), n_stores, days, hours_churn, address_churn)
+
+    rng = np.random.default_rng(n_stores)
+    today = churn(previous, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), rng, hours_churn, address_churn)
+
+    # Replay through the real entry point against the local bucket
+    main.bucket = bucket
+    main.main(None, PayloadTesting=True, payload=today.to_dict(orient='records'))
+
+    metrics_dir = os.path.join(bucket.root, 'metrics')
+    latest = sorted(
+        os.path.join(d, f) for d, _, files in os.walk(metrics_dir) for f in files
+    )[-1]
+    with open(latest) as f:
+        record = json.load(f)
+
+    record['history_bytes'] = bucket.total_bytes(history_store.HISTORY_PREFIX)
+    record['current_bytes'] = bucket.total_bytes('stores_current.json')
+
+    return record
+
+
+def check_fresh_bucket(n_stores: int):
+    """First run against an empty bucket: no stores_current.json, history or delta feed yet."""
+    bucket = LocalBucket(os.path.join(BENCH_ROOT, f'fresh_{n_stores}'))
+    today = make_stores(n_stores, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    main.bucket = bucket
+    main.main(None, PayloadTesting=True, payload=today.to_dict(orient='records'))
+
+    store = RunStorage(bucket)
+    head = store.read_json(delta_feed.DELTA_HEAD_FILE)
+    delta = store.read_json(head['path'])
+    assert len(delta['added']) == len(delta['rows']) == n_stores, (len(delta['added']), len(delta['rows']))
+
+    print(f"Fresh bucket: first run of {n_stores} stores published delta {head['sequence']} "
+          f"({len(delta['rows'])} rows)")
+
+
+def print_report(n_stores: int, days: int, record: dict):
+    print(f"\n{n_stores} stores, {days} days of history "
+          f"(history: {record['history_bytes'] / 1024 ** 2:.1f} MB, "
+          f"current: {record['current_bytes'] / 1024 ** 2:.1f} MB)")
+    print(f"{'stage':<24}{'seconds':>10}{'rows in':>10}{'rows out':>10}{'peak MB':>10}{'delta MB':>10}")
+
+    for stage in record['stages']:
+        print(f"{stage['stage']:<24}{stage['seconds']:>10.3f}{str(stage['rows_in']):>10}"
+              f"{str(stage['rows_out']):>10}{stage.get('peak_rss_mb', 0):>10.1f}{stage['rss_delta_mb']:>10.1f}")
+
+    print(f"{'total':<24}{record['total_seconds']:>10.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--hours-churn', type=float, default=0.01)
+    parser.add_argument('--address-churn', type=float, default=0.002)
+    parser.add_argument('--keep', action='store_true', help='keep the generated bucket directories')
+    args = parser.parse_args()
+
+    try:
+        check_fresh_bucket(min(args.sizes))
+
+        for n in args.sizes:
+            record = run_benchmark(n, args.days, args.hours_churn, args.address_churn)
+            print_report(n, args.days, record)
+    finally:
+        if args.keep:
+            print(f"\nBench data kept in {BENCH_ROOT}")
+        else:
+            shutil.rmtree(BENCH_ROOT, ignore_errors=True)
@@ -0,0 +1,73 @@
+"""
+Columnar change detection for the op-shop scraper.
+
+Compares the `<col>_new` / `<col>_old` pairs of a merged current/previous
+frame with vectorized, NaN-aware masks. The `columns_changed` description is
+only built for rows that actually changed.
+"""
+
+import numpy as np
+import pandas as pd
+
+import hours
+
+# Columns compared between the previous and current scrape
+CHECK_COLS = ['Address', 'Hours']
+
+# Columns compared structurally rather than as raw text: fn(new, old) -> bool array
+COLUMN_COMPARATORS = {
+    'Hours': hours.hours_differ,
+}
+
+
+def column_change_masks(merged_df: pd.DataFrame, check_cols: list = CHECK_COLS) -> dict:
+    """
+    Boolean mask per column of rows whose value changed.
+    A missing previous value (new store) never counts as a change.
+    """
+    masks = {}
+    for col in check_cols:
+        new = merged_df[f'{col}_new']
+        old = merged_df[f'{col}_old']
+
+        differ = COLUMN_COMPARATORS.get(col)
+        changed = differ(new, old) if differ else (new != old).to_numpy(dtype=bool)
+        masks[col] = old.notna().to_numpy() & (new.isna().to_numpy() | changed)
+
+    return masks
+
+
+def detect_changes(merged_df: pd.DataFrame, check_cols: list = CHECK_COLS) -> pd.DataFrame:
+    """
+    Add `change_flag` and `columns_changed` to a merged frame.
+    - change_flag: any of `check_cols` differs from the previous scrape
+    - columns_changed: "<col> before: ...\\n<col> after: ..." joined by ', '
+    """
+    masks = column_change_masks(merged_df, check_cols)
+    change_flag = np.logical_or.reduce(list(masks.values())) if masks else np.zeros(len(merged_df), dtype=bool)
+
+    columns_changed = pd.Series('', index=merged_df.index, dtype=object)
+    changed_idx = merged_df.index[change_flag]
+
+    if len(changed_idx):
+        changed = merged_df.loc[changed_idx]
+        text = pd.Series('', index=changed_idx, dtype=object)
+
+        for col in check_cols:
+            col_mask = pd.Series(masks[col][change_flag], index=changed_idx)
+            if not col_mask.any():
+                continue
+
+            piece = (
+                f'{col} before: ' + changed[f'{col}_old'].astype(str)
+                + f'\n{col} after: ' + changed[f'{col}_new'].astype(str)
+            )
+            sep = np.where(text == '', '', ', ')
+            text = text.where(~col_mask, text + sep + piece)
+
+        columns_changed.loc[changed_idx] = text
+
+    merged_df['change_flag'] = change_flag
+    merged_df['columns_changed'] = columns_changed
+
+    return merged_df
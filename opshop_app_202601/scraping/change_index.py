@@ -0,0 +1,151 @@
+"""
+Incremental per-store change index for the op-shop scraper.
+
+Rather than re-reading history and grouping every past change on each run, a
+small JSON state object is kept next to the history partitions:
+
+    {
+      "as_of": "YYYY-MM-DD HH:MM:SS",
+      "stores": {
+        "<StoreID>": {
+          "last_change_date": "...",
+          "last_columns_changed": "...",
+          "recent_changes": ["...", ...]   # newest last, capped ring
+        }
+      }
+    }
+
+- Each run folds in only its own changed rows
+- Recent/last change flags cost O(stores), independent of history length
+- A missing index is rebuilt once from the changed history partitions
+"""
+
+import pandas as pd
+from google.api_core.exceptions import NotFound
+
+import history_store
+
+CHANGE_INDEX_FILE = f'{history_store.HISTORY_PREFIX}/change_index.json'
+
+# Number of change dates kept per store
+RECENT_CHANGES_SIZE = 10
+
+
+# ---------------------- LOAD / SAVE ----------------------
+
+def load_change_index(store) -> dict:
+    """
+    Load the change index.
+    Rebuilds it from history partitions with changes if it does not exist yet.
+    """
+    try:
+        return store.read_json(CHANGE_INDEX_FILE)
+    except NotFound:
+        print(f"File {CHANGE_INDEX_FILE} does not exist yet, rebuilding from history")
+
+    changes = history_store.read_history(store, changed_only=True)
+
+    return build_change_index(changes)
+
+
+def save_change_index(store, index: dict):
+    """Upload the change index (guarded against concurrent runs)."""
+    store.write_json(CHANGE_INDEX_FILE, index)
+
+
+# ---------------------- UPDATE ----------------------
+
+def build_change_index(changes: pd.DataFrame) -> dict:
+    """Build an index from scratch out of historical change rows."""
+    index = {'as_of': '', 'stores': {}}
+
+    if not changes.empty:
+        update_change_index(index, changes.sort_values('Date'))
+
+    return index
+
+
+def update_change_index(index: dict, data: pd.DataFrame) -> dict:
+    """
+    Fold one run's rows into the index.
+    Only rows with change_flag set are touched; re-applying a run is a no-op.
+    """
+    if data.empty:
+        return index
+
+    changed = data[data['change_flag'] == True]
+    stores = index['stores']
+
+    for store_id, date, columns_changed in changed[['StoreID', 'Date', 'columns_changed']].itertuples(index=False):
+        entry = stores.setdefault(str(store_id), {
+            'last_change_date': '',
+            'last_columns_changed': '',
+            'recent_changes': []
+        })
+
+        if date in entry['recent_changes']:
+            continue
+
+        entry['recent_changes'] = sorted(entry['recent_changes'] + [date])[-RECENT_CHANGES_SIZE:]
+
+        if date >= entry['last_change_date']:
+            entry['last_change_date'] = date
+            entry['last_columns_changed'] = '' if pd.isna(columns_changed) else columns_changed
+
+    index['as_of'] = max(index['as_of'], str(data['Date'].max()))
+
+    return index
+
+
+def rekey_change_index(index: dict, key_func) -> dict:
+    """
+    Re-key store entries with `key_func` (a Series -> Series ID mapping).
+    Entries that collapse onto one key are merged, keeping the latest change.
+    """
+    stores = index['stores']
+    if not stores:
+        return index
+
+    old_ids = pd.Series(list(stores), dtype=object)
+    new_ids = key_func(old_ids)
+    if (old_ids == new_ids).all():
+        return index
+
+    rekeyed = {}
+    for old_id, new_id in zip(old_ids, new_ids):
+        entry = stores[old_id]
+        existing = rekeyed.get(new_id)
+
+        if existing is None:
+            rekeyed[new_id] = entry
+            continue
+
+        existing['recent_changes'] = sorted(set(existing['recent_changes'] + entry['recent_changes']))[-RECENT_CHANGES_SIZE:]
+        if entry['last_change_date'] > existing['last_change_date']:
+            existing['last_change_date'] = entry['last_change_date']
+            existing['last_columns_changed'] = entry['last_columns_changed']
+
+    index['stores'] = rekeyed
+
+    return index
+
+
+# ---------------------- QUERY ----------------------
+
+def change_flags(index: dict, cutoff: str) -> pd.DataFrame:
+    """
+    Per-store change flags from the index.
+    - change_in_last_7_days: most recent change is on/after `cutoff` ('YYYY-MM-DD')
+    - Last Change Date / Last Columns Changed: most recent change seen
+    """
+    rows = [
+        (
+            store_id,
+            bool(entry['recent_changes']) and entry['recent_changes'][-1] >= cutoff,
+            entry['last_change_date'],
+            entry['last_columns_changed']
+        )
+        for store_id, entry in index['stores'].items()
+    ]
+
+    return pd.DataFrame(rows, columns=['StoreID', 'change_in_last_7_days', 'Last Change Date', 'Last Columns Changed'])
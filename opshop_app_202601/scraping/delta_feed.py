@@ -0,0 +1,168 @@
+"""
+Per-run delta feed published next to stores_current.json.
+
+Each run writes a small, numbered changes document and advances a head
+pointer, so consumers holding a cached snapshot can catch up without
+re-downloading the whole snapshot:
+
+    deltas/head.json                  {"sequence": 42, "run_time": "...", "path": "...",
+                                       "snapshot_generation": ...}
+    deltas/seq-00000042.json.gz       {"sequence": 42, "previous_sequence": 41,
+                                       "run_time": "...", "full": false,
+                                       "changed": [...], "added": [...],
+                                       "removed": [...], "rows": [...]}
+
+- changed/added/removed: StoreIDs with change_flag set, new this run, gone this run
+- rows: full current records of every store whose record differs from the
+  previous snapshot in anything but Date (a row hash comparison), so a delta
+  is a set of upserts
+- full: the delta carries every current row and replaces the snapshot.
+  Sent when the last delta does not end at the snapshot this run replaced
+  (the head's snapshot_generation), i.e. a run saved its snapshot but failed
+  to publish its delta
+- Sequence numbers increase by one per run. The head is written with a
+  generation precondition, so concurrent runs cannot both advance it. A delta
+  document past the head is an orphan of a run that died before moving the
+  head, and is overwritten (guarded by its generation) rather than blocking
+  every later run.
+
+The snapshot is saved before its delta is published, so a feed failure never
+holds back stores_current.json.
+
+Applying a delta (`apply_delta`) is idempotent. A consumer reads the head,
+then the snapshot, then applies every delta after the head's sequence.
+A snapshot newer than the head it read is harmless.
+"""
+
+import json
+
+import pandas as pd
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from run_storage import MISSING
+
+DELTA_PREFIX = 'deltas'
+DELTA_HEAD_FILE = f'{DELTA_PREFIX}/head.json'
+
+# Columns that change every run and do not make a row an upsert
+UNHASHED_COLS = ['Date']
+
+
+def delta_path(sequence: int) -> str:
+    return f"{DELTA_PREFIX}/seq-{sequence:08d}.json.gz"
+
+
+def load_head(store) -> dict:
+    """The latest published delta ({'sequence': 0} before the first run)."""
+    try:
+        return store.read_json(DELTA_HEAD_FILE)
+    except NotFound:
+        return {'sequence': 0, 'run_time': None, 'path': None}
+
+
+# ---------------------- BUILD ----------------------
+
+def record_hashes(data: pd.DataFrame, columns: list) -> pd.Series:
+    """
+    Hex hash of each row's JSON record over `columns`.
+    Rows are hashed as the snapshot stores them, so a row and its copy read
+    back from stores_current.json hash the same.
+    """
+    # to_json of an empty frame is a lone newline, not zero lines
+    if data.empty:
+        return pd.Series(index=data.index, dtype=object)
+
+    lines = data.reindex(columns=columns).to_json(orient='records', lines=True).splitlines()
+    hashes = pd.util.hash_pandas_object(pd.Series(lines, dtype=object), index=False).to_numpy()
+
+    return pd.Series([f'{h:016x}' for h in hashes], index=data.index, dtype=object)
+
+
+def build_delta(data: pd.DataFrame, previous: pd.DataFrame, full: bool = False) -> dict:
+    """
+    Changes of this run's rows against the previous snapshot.
+    With `full`, every row is sent and the delta replaces the snapshot.
+    Returns the delta body without sequence numbers.
+    """
+    current_ids = data['StoreID'].astype(str)
+    previous_ids = previous['StoreID'].astype(str) if not previous.empty else pd.Series(dtype=str)
+
+    changed = data['change_flag'].fillna(False).astype(bool) if 'change_flag' in data else pd.Series(False, index=data.index)
+    added = ~current_ids.isin(previous_ids)
+    removed = previous_ids[~previous_ids.isin(current_ids)]
+
+    # Any difference from the previous record has to be re-sent (7-day flag
+    # flips, coordinates, ...); new stores have no previous record
+    columns = [c for c in data.columns if c not in UNHASHED_COLS]
+    previous_hashes = pd.Series(
+        record_hashes(previous, columns).to_numpy(), index=previous_ids, dtype=object
+    ).groupby(level=0).last()
+    differs = current_ids.map(previous_hashes) != record_hashes(data, columns)
+
+    upserts = data if full else data[differs]
+
+    return {
+        'full': full,
+        'changed': current_ids[changed].tolist(),
+        'added': current_ids[added].tolist(),
+        'removed': removed.tolist(),
+        'rows': json.loads(upserts.to_json(orient='records')),
+    }
+
+
+# ---------------------- PUBLISH ----------------------
+
+def publish_delta(store, data: pd.DataFrame, previous: pd.DataFrame, run_time: str,
+                  previous_generation, snapshot_generation) -> dict:
+    """
+    Write this run's delta under the next sequence number and move the head to it.
+    `previous` is the snapshot this run replaced (generation `previous_generation`),
+    `snapshot_generation` the one it saved.
+    Returns the new head.
+    Raises google.api_core.exceptions.PreconditionFailed if another run got there first.
+    """
+    head = load_head(store)
+    sequence = head['sequence'] + 1
+
+    # Consumers past the head hold the snapshot it ended at; anything else is a gap
+    full = head['sequence'] > 0 and head.get('snapshot_generation') != previous_generation
+    if full:
+        print(f"Delta {head['sequence']} does not end at the replaced snapshot, sending a full delta")
+
+    delta = {
+        'sequence': sequence,
+        'previous_sequence': head['sequence'],
+        'run_time': run_time,
+        **build_delta(data, previous, full=full),
+    }
+
+    path = delta_path(sequence)
+    try:
+        store.write_json(path, delta, if_generation_match=MISSING)
+    except PreconditionFailed:
+        # Left by a run that died before moving the head: replace it
+        print(f"Replacing orphan {path} past head {head['sequence']}")
+        store.write_json(path, delta, if_generation_match=store.current_generation(path))
+
+    head = {'sequence': sequence, 'run_time': run_time, 'path': path, 'snapshot_generation': snapshot_generation}
+    store.write_json(DELTA_HEAD_FILE, head, compress=False)
+
+    print(f"Published {'full ' if full else ''}delta {sequence}: {len(delta['changed'])} changed, "
+          f"{len(delta['added'])} added, {len(delta['removed'])} removed, {len(delta['rows'])} rows")
+
+    return head
+
+
+# ---------------------- APPLY ----------------------
+
+def apply_delta(snapshot: pd.DataFrame, delta: dict) -> pd.DataFrame:
+    """Apply a delta to a snapshot DataFrame: drop removed stores, upsert rows (or replace it if full)."""
+    rows = pd.DataFrame(delta['rows'])
+    if delta.get('full'):
+        return rows
+
+    dropped = set(delta['removed']) | set(rows['StoreID'].astype(str) if not rows.empty else [])
+
+    kept = snapshot[~snapshot['StoreID'].astype(str).isin(dropped)]
+
+    return pd.concat([kept, rows], ignore_index=True)
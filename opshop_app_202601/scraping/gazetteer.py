@@ -0,0 +1,285 @@
+"""
+Offline gazetteer of Australian suburb and postcode centroids.
+
+A last-resort geocoder that needs no network: addresses are parsed for their
+suburb, state and postcode and resolved to the matching centroid. Results are
+approximate (suburb/postcode level) and are flagged as such by the caller.
+
+The gazetteer ships as a sorted NumPy structured array (`gazetteer.npy`)
+that is memory-mapped on load, so opening it costs nothing and lookups only
+touch the pages they need:
+
+- Exact index: binary search on keys 's:<suburb>|<state>' and 'p:<postcode>'
+- Fuzzy index: suburb names grouped by state (built on first use), matched
+  with difflib for misspelt suburbs
+
+Build or rebuild it with:
+
+    python gazetteer.py --csv australian_postcodes.csv   # postcode,locality,state,lat,long
+    python gazetteer.py --stores stores_current.json     # centroids of geocoded stores
+"""
+
+import os
+import re
+import json
+import argparse
+import difflib
+import threading
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from addresses import canonical_address_key, canonical_address_keys
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.npy')
+
+GAZETTEER_DTYPE = np.dtype([('key', 'S64'), ('lat', 'f4'), ('lon', 'f4')])
+
+STATES = ['act', 'nsw', 'nt', 'qld', 'sa', 'tas', 'vic', 'wa']
+
+# Trailing '<state> <postcode>' / '<postcode>' / '<state>' of the last address component
+STATE_POSTCODE_RE = re.compile(r'\s*\b(?:(' + '|'.join(STATES) + r')\b)?\s*(\d{4})?$')
+
+# Minimum difflib ratio for a fuzzy suburb match
+FUZZY_CUTOFF = 0.85
+
+# Australia Post postcode ranges (inclusive) per state, used to fill in and
+# cross-check states ('Albury VIC 2640' is in NSW)
+POSTCODE_STATES = [
+    (200, 299, 'act'), (800, 999, 'nt'),
+    (1000, 2599, 'nsw'), (2600, 2618, 'act'), (2619, 2899, 'nsw'),
+    (2900, 2920, 'act'), (2921, 2999, 'nsw'),
+    (3000, 3999, 'vic'), (4000, 4999, 'qld'), (5000, 5999, 'sa'),
+    (6000, 6999, 'wa'), (7000, 7999, 'tas'),
+    (8000, 8999, 'vic'), (9000, 9999, 'qld'),
+]
+
+
+def suburb_key(suburb: str, state: str = '') -> bytes:
+    return f"s:{suburb}|{state}".encode('utf-8')
+
+
+def postcode_key(postcode: str) -> bytes:
+    return f"p:{postcode}".encode('utf-8')
+
+
+def postcode_state(postcode: str) -> str:
+    """State a postcode belongs to ('' if unknown)."""
+    if not postcode.isdigit():
+        return ''
+    number = int(postcode)
+    for low, high, state in POSTCODE_STATES:
+        if low <= number <= high:
+            return state
+    return ''
+
+
+def parse_locality(address: str) -> tuple:
+    """
+    (suburb, state, postcode) from the last component of an address.
+    A missing state is taken from the postcode. Missing parts are ''.
+    """
+    key = canonical_address_key(address)
+    if not key:
+        return '', '', ''
+
+    last = key.rsplit(', ', 1)[-1]
+    m = STATE_POSTCODE_RE.search(last)
+    postcode = m.group(2) or ''
+    state = m.group(1) or postcode_state(postcode)
+    suburb = last[:m.start()].strip()
+
+    # 'Suburb, NSW 2000' puts the suburb in the previous component
+    if not suburb and ', ' in key:
+        suburb = key.rsplit(', ', 2)[-2]
+
+    # Street lines are not suburbs
+    if re.match(r'^\d', suburb):
+        suburb = ''
+
+    return suburb, state, postcode
+
+
+# ---------------------- LOOKUP ----------------------
+
+class Gazetteer:
+    """
+    Memory-mapped centroid lookup.
+    locate(address) returns (lat, lon) or None; hits/misses are counted.
+    Scrapers call it from worker threads, so the counters and the lazily
+    built fuzzy index are guarded by a lock.
+    """
+
+    def __init__(self, path: str = GAZETTEER_FILE):
+        self.path = path
+        self.entries = np.load(path, mmap_mode='r')
+        self.keys = self.entries['key']
+        self.by_state = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_FILE):
+        """Open the bundled gazetteer, or return None if it is not there."""
+        if not os.path.exists(path):
+            print(f"No gazetteer at {path}, skipping offline geocoding")
+            return None
+        return cls(path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _exact(self, key: bytes):
+        i = np.searchsorted(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return (float(self.entries['lat'][i]), float(self.entries['lon'][i]))
+        return None
+
+    def _suburb_any_state(self, suburb: str):
+        """Centroid of a suburb name when the address has no state."""
+        prefix = f"s:{suburb}|".encode('utf-8')
+        i = np.searchsorted(self.keys, prefix)
+        if i < len(self.keys) and self.keys[i].startswith(prefix):
+            return (float(self.entries['lat'][i]), float(self.entries['lon'][i]))
+        return None
+
+    def _fuzzy_index(self) -> dict:
+        with self.lock:
+            if self.by_state is None:
+                by_state = defaultdict(list)
+                for key in self.keys[np.char.startswith(self.keys, b's:')]:
+                    name, key_state = key[2:].decode('utf-8').split('|')
+                    by_state[key_state].append(name)
+                    by_state['*'].append(name)
+                self.by_state = by_state
+        return self.by_state
+
+    def _fuzzy(self, suburb: str, state: str):
+        by_state = self._fuzzy_index()
+        names = by_state.get(state or '*') or by_state['*']
+        match = difflib.get_close_matches(suburb, names, n=1, cutoff=FUZZY_CUTOFF)
+        if not match:
+            return None
+
+        return self._exact(suburb_key(match[0], state)) or self._suburb_any_state(match[0])
+
+    def locate(self, address: str):
+        """
+        Approximate (lat, lon) for an address, or None.
+        Tries suburb + state, suburb alone, postcode, then a fuzzy suburb match.
+        """
+        suburb, state, postcode = parse_locality(address)
+
+        latlon = None
+        if suburb:
+            latlon = self._exact(suburb_key(suburb, state)) or self._suburb_any_state(suburb)
+        if latlon is None and postcode:
+            latlon = self._exact(postcode_key(postcode))
+        if latlon is None and suburb:
+            latlon = self._fuzzy(suburb, state)
+
+        with self.lock:
+            if latlon is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return latlon
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'entries': len(self), 'hits': self.hits, 'misses': self.misses}
+
+
+# ---------------------- BUILD ----------------------
+
+def build_gazetteer(localities: pd.DataFrame, path: str = GAZETTEER_FILE) -> int:
+    """
+    Write a gazetteer from rows of suburb, state, postcode, lat, lon.
+    Suburbs are keyed by `canonical_address_key` like the lookups
+    ('St Kilda' -> 'street kilda'). Missing states come from the postcode;
+    rows whose state and postcode disagree, and suburbs with no state, are
+    dropped. Duplicate suburbs/postcodes are averaged into one centroid.
+    Returns the number of entries written.
+    """
+    localities = localities.dropna(subset=['lat', 'lon'])
+    localities = localities.assign(
+        suburb=canonical_address_keys(localities['suburb']),
+        state=localities['state'].fillna('').astype(str).str.lower().str.strip(),
+        postcode=localities['postcode'].fillna('').astype(str).str.extract(r'(\d{3,4})', expand=False).fillna('').str.zfill(4),
+    )
+
+    # A typo in either ('Belmont VIC 6104') would drag a centroid across the country
+    by_postcode = localities['postcode'].map(postcode_state)
+    conflict = (by_postcode != '') & (localities['state'] != '') & (by_postcode != localities['state'])
+    localities = localities[~conflict].assign(state=by_postcode.where(by_postcode != '', localities['state']))
+
+    suburbs = localities[(localities['suburb'] != '') & (localities['state'] != '')]
+    suburbs = suburbs.groupby(['suburb', 'state'])[['lat', 'lon']].mean().reset_index()
+    suburbs['key'] = 's:' + suburbs['suburb'] + '|' + suburbs['state']
+
+    postcodes = localities[localities['postcode'] != '0000']
+    postcodes = postcodes.groupby('postcode')[['lat', 'lon']].mean().reset_index()
+    postcodes['key'] = 'p:' + postcodes['postcode']
+
+    keyed = pd.concat([suburbs, postcodes])[['key', 'lat', 'lon']]
+    keyed = keyed[keyed['key'].str.encode('utf-8').str.len() <= GAZETTEER_DTYPE['key'].itemsize]
+
+    entries = np.empty(len(keyed), dtype=GAZETTEER_DTYPE)
+    entries['key'] = keyed['key'].str.encode('utf-8').to_numpy()
+    entries['lat'] = keyed['lat'].to_numpy()
+    entries['lon'] = keyed['lon'].to_numpy()
+    entries.sort(order='key')
+
+    np.save(path, entries)
+
+    return len(entries)
+
+
+def localities_from_csv(csv_path: str) -> pd.DataFrame:
+    """Rows from a postcode CSV (postcode, locality/suburb, state, lat, long/lon)."""
+    df = pd.read_csv(csv_path, dtype=str)
+    df.columns = df.columns.str.lower()
+
+    return pd.DataFrame({
+        'suburb': df.get('locality', df.get('suburb')),
+        'state': df['state'],
+        'postcode': df['postcode'],
+        'lat': pd.to_numeric(df['lat'], errors='coerce'),
+        'lon': pd.to_numeric(df.get('long', df.get('lon', df.get('longitude'))), errors='coerce'),
+    })
+
+
+def localities_from_stores(records: list) -> pd.DataFrame:
+    """Rows from already-geocoded store records (Address, Latitude, Longitude)."""
+    df = pd.DataFrame(records)
+    parsed = pd.DataFrame(
+        [parse_locality(a) for a in df['Address'].fillna('')],
+        columns=['suburb', 'state', 'postcode'], index=df.index
+    )
+
+    return parsed.assign(
+        lat=pd.to_numeric(df['Latitude'], errors='coerce'),
+        lon=pd.to_numeric(df['Longitude'], errors='coerce'),
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', nargs='*', default=[], help='postcode/locality CSV files')
+    parser.add_argument('--stores', nargs='*', default=[], help='store JSON files with Address/Latitude/Longitude')
+    parser.add_argument('--out', default=GAZETTEER_FILE)
+    args = parser.parse_args()
+
+    frames = [localities_from_csv(p) for p in args.csv]
+    for p in args.stores:
+        with open(p) as f:
+            frames.append(localities_from_stores(json.load(f)))
+
+    if not frames:
+        parser.error('give at least one --csv or --stores source')
+
+    n = build_gazetteer(pd.concat(frames, ignore_index=True), args.out)
+    print(f"Wrote {n} entries to {args.out}")
@@ -0,0 +1,372 @@
+"""
+Batch geocoding for the op-shop scraper.
+
+All cache-miss addresses of a scrape are geocoded together by a small worker
+pool. Every request goes through a shared token-bucket rate limiter so the
+pool never exceeds the geocoder's usage policy (Nominatim: 1 request/second).
+The cache is synced to GCS once, at the end of the stage.
+
+Any object with a geopy-style `geocode(query, timeout=...)` method can be used
+as the geocoder; `LocalGeocoder` is an offline stand-in for tests/benchmarks.
+
+An optional offline `gazetteer.Gazetteer` places addresses at suburb/postcode
+centroids before any network call; those results are reported as approximate
+and never cached, and a few per run are refined over the network.
+
+Results live in `GeocodeCache`, an SQLite file synced to the bucket through a
+`run_storage.RunStorage`. Entries are keyed by a canonical address key,
+looked up by primary key without loading the cache into memory, and failed
+lookups expire after a TTL.
+"""
+
+import os
+import time
+import zlib
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from addresses import canonical_address_key
+from run_storage import MISSING
+
+# Nominatim allows at most one request per second
+NOMINATIM_RATE = 1.0
+GEOCODE_WORKERS = 4
+GEOCODE_TIMEOUT = 10
+
+GEOCODE_CACHE_DB = 'geocode_cache.sqlite'
+LEGACY_GEOCODE_CACHE_FILE = 'geocode_cache.json'
+LOCAL_CACHE_DIR = '/tmp'
+
+# Failed lookups are retried once they are older than this
+NEGATIVE_TTL_DAYS = 14
+
+# Addresses placed by the gazetteer that still get a precise network lookup per run
+GEOCODE_REFINE_LIMIT = 25
+
+
+# ---------------------- RATE LIMITING ----------------------
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    `rate` tokens are added per second, up to `capacity` banked tokens.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+# ---------------------- CACHE ----------------------
+
+class GeocodeCache:
+    """
+    SQLite-backed geocode cache.
+    - Keys are canonical address keys, so trivial spelling differences hit
+    - get() returns (lat, lon), or None on a miss or an expired failed lookup
+    - hits/misses/expired counters are kept per instance
+    - `stale` is set when an upload lost a race; the owner should re-open it
+    """
+
+    def __init__(self, path: str, negative_ttl_days: int = NEGATIVE_TTL_DAYS):
+        self.path = path
+        self.negative_ttl = timedelta(days=negative_ttl_days)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.dirty = False
+        self.stale = False
+        self.blob_name = os.path.basename(path)
+        self.generation = None
+
+        # Scrapers run in worker threads, so the connection is shared behind a lock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocodes (
+                key TEXT PRIMARY KEY,
+                address TEXT,
+                lat REAL,
+                lon REAL,
+                updated TEXT
+            )
+        """)
+
+    @classmethod
+    def from_store(cls, store, blob_name: str = GEOCODE_CACHE_DB, **kwargs):
+        """
+        Download the cache file from GCS (via a RunStorage) to local disk and open it.
+        Seeds it from the legacy JSON cache if no database exists yet.
+        """
+        path = os.path.join(LOCAL_CACHE_DIR, blob_name)
+
+        if os.path.exists(path):
+            os.remove(path)
+
+        try:
+            with open(path, 'wb') as f:
+                f.write(store.read_bytes(blob_name))
+            print(f"Loaded {blob_name} from GCS")
+        except NotFound:
+            print(f"File {blob_name} does not exist yet")
+            os.remove(path)
+
+        cache = cls(path, **kwargs)
+        cache.blob_name = blob_name
+        cache.generation = store.generation(blob_name)
+
+        if cache.generation == MISSING:
+            try:
+                legacy = store.read_json(LEGACY_GEOCODE_CACHE_FILE)
+                print(f"Seeding {blob_name} from {LEGACY_GEOCODE_CACHE_FILE}")
+                cache.import_legacy(legacy)
+            except NotFound:
+                pass
+
+        return cache
+
+    def _row(self, address: str):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT lat, lon, updated FROM geocodes WHERE key = ?",
+                (canonical_address_key(address),)
+            ).fetchone()
+
+    def _is_expired(self, row) -> bool:
+        lat, lon, updated = row
+        if lat is not None:
+            return False
+        return not updated or datetime.fromisoformat(updated) < datetime.now() - self.negative_ttl
+
+    def get(self, address: str, default=None):
+        """Cached (lat, lon) for an address, counting hits and misses."""
+        row = self._row(address)
+
+        if row is None:
+            self.misses += 1
+            return default
+
+        if self._is_expired(row):
+            self.expired += 1
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return (row[0], row[1])
+
+    def __contains__(self, address: str) -> bool:
+        row = self._row(address)
+        return row is not None and not self._is_expired(row)
+
+    def __setitem__(self, address: str, latlon):
+        self.update({address: latlon})
+
+    def update(self, results: dict, updated: str = None):
+        """Insert or replace entries; (None, None) records a failed lookup."""
+        updated = updated if updated is not None else datetime.now().isoformat(timespec='seconds')
+        rows = [(canonical_address_key(a), a, latlon[0], latlon[1], updated) for a, latlon in results.items()]
+
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO geocodes (key, address, lat, lon, updated) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+            self.dirty = True
+
+    def import_legacy(self, legacy: dict):
+        """
+        Load a legacy {address: [lat, lon]} dict.
+        Legacy failures get no timestamp so they are retried on the next run.
+        """
+        found = {a: v for a, v in legacy.items() if v and v[0] is not None}
+        failed = {a: (None, None) for a in legacy if a not in found}
+        self.update(found)
+        self.update(failed, updated='')
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {'entries': len(self), 'hits': self.hits, 'misses': self.misses, 'expired': self.expired}
+
+    def sync(self, store):
+        """
+        Upload the cache file if anything changed.
+        Guarded by the generation it was loaded from; if another run updated
+        the cache in the meantime, this run's new entries are dropped and the
+        cache is marked stale so it gets re-opened from the newer copy.
+        """
+        if not self.dirty:
+            return
+
+        with self.lock:
+            self.conn.commit()
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        try:
+            store.write(self.blob_name, data, content_type='application/x-sqlite3',
+                        if_generation_match=self.generation)
+        except PreconditionFailed:
+            print(f"{self.blob_name} changed since it was loaded, skipping upload")
+            self.stale = True
+            return
+
+        self.generation = store.generation(self.blob_name)
+        self.dirty = False
+
+
+# ---------------------- GEOCODERS ----------------------
+
+Location = namedtuple('Location', ['latitude', 'longitude'])
+
+
+class LocalGeocoder:
+    """
+    Offline stand-in for Nominatim.
+    - known: optional {address: (lat, lon)} answers; (None, None) means not found
+    - unknown addresses get a deterministic point inside Australia
+    - latency: seconds to sleep per call, to mimic a network round trip
+    """
+
+    def __init__(self, known: dict = None, latency: float = 0.0):
+        self.known = known or {}
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def geocode(self, query: str, timeout: float = None):
+        with self.lock:
+            self.calls += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if query in self.known:
+            lat, lon = self.known[query]
+            return Location(lat, lon) if lat is not None else None
+
+        h = zlib.crc32(query.encode('utf-8'))
+        return Location(-10.0 - (h % 3000) / 100, 113.0 + (h // 3000 % 4000) / 100)
+
+
+# ---------------------- GEOCODING ----------------------
+
+def geocode_address(geolocator, address: str, limiter: TokenBucket = None, retry: bool = True) -> tuple:
+    """
+    Geocode one address, retrying once without its first component (if `retry`).
+    Returns (lat, lon), or (None, None) if both attempts fail.
+    """
+    if limiter:
+        limiter.acquire()
+    location = geolocator.geocode(address, timeout=GEOCODE_TIMEOUT)
+
+    # Retry with simplified address if first attempt fails
+    if not location and retry and ',' in address:
+        parts = address.split(',', 1)
+        if limiter:
+            limiter.acquire()
+        location = geolocator.geocode(parts[1].strip(), timeout=GEOCODE_TIMEOUT)
+
+    if location:
+        return (location.latitude, location.longitude)
+
+    return (None, None)
+
+
+def batch_geocode(addresses, cache: dict, geolocator, workers: int = GEOCODE_WORKERS,
+                  rate: float = NOMINATIM_RATE, gazetteer=None, approximate: set = None,
+                  refine: int = GEOCODE_REFINE_LIMIT) -> dict:
+    """
+    Geocode every address missing from `cache` through a rate-limited worker pool.
+    Results are added to `cache`; nothing is persisted here.
+    Returns {address: (lat, lon)} for all addresses, cached or newly looked up.
+
+    With a `gazetteer`, uncached and previously failed addresses are first
+    resolved offline to a suburb/postcode centroid and added to `approximate`.
+    Only `refine` of those per run (plus addresses the gazetteer can't place)
+    go to the network for a precise location, and then without the
+    truncated-address retry.
+    """
+    approximate = set() if approximate is None else approximate
+
+    latlons = {}
+    for address in dict.fromkeys(addresses):
+        latlon = cache.get(address) if address else (None, None)
+        if latlon is not None:
+            latlons[address] = latlon
+
+    misses = [a for a in dict.fromkeys(addresses) if a not in latlons]
+
+    offline = {}
+    if gazetteer is not None:
+        failed = [a for a, latlon in latlons.items() if a and latlon[0] is None]
+        for address in misses + failed:
+            latlon = gazetteer.locate(address)
+            if latlon is not None:
+                offline[address] = latlon
+
+        approximate.update(offline)
+        latlons.update(offline)
+
+        # Uncached addresses placed offline wait for a later run beyond the refine budget
+        placed = [a for a in misses if a in offline]
+        misses = [a for a in misses if a not in offline] + placed[:refine]
+        print(f"Gazetteer placed {len(offline)} addresses ({gazetteer.stats()})")
+
+    if not misses:
+        return latlons
+
+    print(f"Geocoding {len(misses)} uncached addresses with {workers} workers")
+
+    limiter = TokenBucket(rate)
+    results = {}
+
+    def lookup(address):
+        try:
+            return address, geocode_address(geolocator, address, limiter, retry=address not in offline)
+        except Exception as e:
+            # Leave it out of the cache so the next run retries it
+            print(f"Geocoding failed for {address!r}: {e}")
+            return address, None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for address, latlon in pool.map(lookup, misses):
+            if latlon is not None:
+                results[address] = latlon
+
+    cache.update(results)
+
+    # A failed precise lookup keeps its offline centroid for this run
+    found = {a: latlon for a, latlon in results.items() if latlon[0] is not None or a not in offline}
+    approximate.difference_update(found)
+    latlons.update(found)
+
+    return latlons
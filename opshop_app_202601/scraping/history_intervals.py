@@ -0,0 +1,258 @@
+"""
+Interval (SCD type 2) history for op-shop stores.
+
+Instead of a copy of every store on every run, each store's history is a list
+of validity intervals, one per distinct state:
+
+    StoreID, <tracked fields>, state_hash, valid_from, valid_to, columns_changed
+
+- A new interval is opened only when a tracked field changes (its state hash
+  differs from the open interval's); the old interval is closed at that run
+- A store missing from a run of its chain has its interval closed
+- `valid_to` is null for a store's current state
+- "State of store X on date D" is an `as_of` lookup
+
+The table lives in one gzip NDJSON blob next to the partitions. If it doesn't
+exist yet it is compacted once from the existing full-run history (legacy
+`stores_history.json` and/or its migrated partitions). Partitions written
+since hold only changed rows, so a store missing from one is not gone; once
+any exist a lost table cannot be rebuilt and loading fails instead:
+
+    python history_intervals.py   # compact the bucket's history and report sizes
+"""
+
+import io
+import gzip
+
+import numpy as np
+import pandas as pd
+from google.api_core.exceptions import NotFound
+
+import addresses
+import history_store
+from run_storage import decompress
+
+INTERVALS_FILE = f'{history_store.HISTORY_PREFIX}/intervals.ndjson.gz'
+
+# Fields that define a store's state; a change in any opens a new interval
+TRACKED_COLS = ['Store', 'Suburb', 'Address', 'Latitude', 'Longitude', 'Hours']
+COORDINATE_COLS = ['Latitude', 'Longitude']
+
+INTERVAL_COLS = ['StoreID'] + TRACKED_COLS + ['state_hash', 'valid_from', 'valid_to', 'columns_changed']
+
+
+def state_hash(data: pd.DataFrame) -> pd.Series:
+    """
+    Hex hash of each row's tracked fields.
+    Coordinates hash by float32 value, so legacy string coordinates and
+    float columns of the same location agree.
+    """
+    tracked = data.reindex(columns=TRACKED_COLS)
+    for col in COORDINATE_COLS:
+        tracked[col] = pd.to_numeric(tracked[col], errors='coerce').astype('float32')
+    tracked = tracked.astype(str)
+    hashes = pd.util.hash_pandas_object(tracked, index=False).to_numpy()
+
+    return pd.Series([f'{h:016x}' for h in hashes], index=data.index)
+
+
+def empty_intervals() -> pd.DataFrame:
+    return pd.DataFrame(columns=INTERVAL_COLS)
+
+
+# ---------------------- LOAD / SAVE ----------------------
+
+def load_intervals(store) -> pd.DataFrame:
+    """
+    Load the interval table.
+    Compacts it from the existing snapshot history if it does not exist yet.
+    """
+    try:
+        content = decompress(store.read_bytes(INTERVALS_FILE))
+    except NotFound:
+        print(f"File {INTERVALS_FILE} does not exist yet, compacting from history")
+        return build_intervals(load_snapshots(store))
+
+    if not content.strip():
+        return empty_intervals()
+
+    # dtype/convert_dates off so IDs like '0715' and date strings survive untouched
+    intervals = pd.read_json(io.BytesIO(content), lines=True, dtype=False, convert_dates=False)
+    intervals = intervals.reindex(columns=INTERVAL_COLS)
+
+    # Tables compacted before STC IDs were canonical keep the raw address IDs
+    intervals['StoreID'] = addresses.canonical_store_ids(intervals['StoreID'])
+
+    # Re-hash, so tables written by an older state_hash compare equal
+    intervals['state_hash'] = state_hash(intervals)
+
+    return intervals
+
+
+def save_intervals(store, intervals: pd.DataFrame):
+    """Upload the interval table (guarded against concurrent runs)."""
+    payload = intervals[INTERVAL_COLS].to_json(orient='records', lines=True)
+
+    store.write(
+        INTERVALS_FILE,
+        gzip.compress(payload.encode('utf-8'), mtime=0),
+        content_type='application/x-ndjson',
+        content_encoding='gzip'
+    )
+
+
+def load_snapshots(store) -> pd.DataFrame:
+    """
+    Every stored per-run snapshot row: the legacy single blob plus any
+    full-run partitions, without migrating the legacy blob into partitions.
+    STC IDs are re-keyed to canonical address keys.
+    Raises RuntimeError if the history has changed-rows-only partitions,
+    which would close every unchanged store at each of those runs.
+    """
+    frames = []
+
+    try:
+        legacy = store.read_json(history_store.LEGACY_HISTORY_FILE)
+        frames.append(pd.DataFrame(legacy).rename(columns={'Columns Changed': 'columns_changed'}))
+    except NotFound:
+        pass
+
+    try:
+        manifest = store.read_json(history_store.MANIFEST_FILE)
+    except NotFound:
+        manifest = {'partitions': []}
+
+    partial = [p for p in manifest['partitions'] if not history_store.is_full_run(p)]
+    if partial:
+        raise RuntimeError(
+            f"Cannot rebuild {INTERVALS_FILE}: {len(partial)} partitions since {partial[0]['date']} "
+            f"hold only changed rows. Restore the interval table instead."
+        )
+
+    frames.append(history_store.read_history(store, manifest=manifest))
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    snapshots = pd.concat(frames, ignore_index=True)
+
+    # Previous runs used raw formatted addresses for STC IDs
+    snapshots['StoreID'] = addresses.canonical_store_ids(snapshots['StoreID'])
+
+    return snapshots.drop_duplicates(subset=['StoreID', 'Date'], keep='last')
+
+
+# ---------------------- BUILD / UPDATE ----------------------
+
+def next_chain_runs(data: pd.DataFrame) -> pd.Series:
+    """For each row, the Date of its chain's next run after the row's Date (None if none)."""
+    next_runs = pd.Series(None, index=data.index, dtype=object)
+
+    for chain, rows in data.groupby('Store'):
+        run_dates = np.sort(rows['Date'].unique())
+        pos = np.searchsorted(run_dates, rows['Date'].to_numpy(), side='right')
+        has_next = pos < len(run_dates)
+        next_runs[rows.index[has_next]] = run_dates[pos[has_next]]
+
+    return next_runs
+
+
+def build_intervals(snapshots: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fold per-run snapshot rows into intervals.
+    Consecutive runs of a store with the same state hash share one interval;
+    a state change or a run of its chain without the store ends it.
+    """
+    if snapshots.empty:
+        return empty_intervals()
+
+    snapshots = snapshots.sort_values(['StoreID', 'Date']).reset_index(drop=True)
+    snapshots['state_hash'] = state_hash(snapshots)
+    snapshots['next_run'] = next_chain_runs(snapshots)
+
+    previous = snapshots.shift(1)
+    continues = (
+        (snapshots['StoreID'] == previous['StoreID'])
+        & (snapshots['state_hash'] == previous['state_hash'])
+        & (snapshots['Date'] == previous['next_run'])
+    )
+    interval_id = (~continues).cumsum()
+
+    # First row of an interval gives its state, last row when it ends
+    rows = snapshots.index.to_series().groupby(interval_id)
+    intervals = snapshots.loc[rows.min().to_numpy()].reset_index(drop=True)
+    intervals['valid_from'] = intervals['Date']
+    intervals['valid_to'] = snapshots.loc[rows.max().to_numpy(), 'next_run'].to_numpy()
+
+    if 'columns_changed' not in intervals:
+        intervals['columns_changed'] = ''
+    intervals['columns_changed'] = intervals['columns_changed'].fillna('')
+
+    return intervals.reindex(columns=INTERVAL_COLS)
+
+
+def update_intervals(intervals: pd.DataFrame, data: pd.DataFrame, run_date: str) -> pd.DataFrame:
+    """
+    Fold one run's rows into the interval table.
+    - Changed stores: open interval closed at `run_date`, new one opened
+    - New stores: interval opened
+    - Stores missing from a chain that was scraped this run: interval closed
+    Re-applying the same run is a no-op.
+    """
+    today = data.drop_duplicates(subset='StoreID', keep='last').copy()
+    today['state_hash'] = state_hash(today)
+
+    is_open = intervals['valid_to'].isna()
+    current = intervals.loc[is_open, ['StoreID', 'state_hash']]
+    merged = today[['StoreID', 'state_hash']].merge(current, on='StoreID', how='left', suffixes=('', '_open'))
+
+    changed_ids = merged.loc[merged['state_hash'] != merged['state_hash_open'], 'StoreID']
+    scraped_chains = today['Store'].unique()
+    gone = is_open & ~intervals['StoreID'].isin(today['StoreID']) & intervals['Store'].isin(scraped_chains)
+
+    intervals = intervals.copy()
+    intervals.loc[(is_open & intervals['StoreID'].isin(changed_ids)) | gone, 'valid_to'] = run_date
+
+    opened = today[today['StoreID'].isin(changed_ids)].assign(valid_from=run_date, valid_to=None)
+    if 'columns_changed' not in opened:
+        opened['columns_changed'] = ''
+    opened['columns_changed'] = opened['columns_changed'].fillna('')
+
+    if opened.empty:
+        return intervals
+
+    return pd.concat([intervals, opened.reindex(columns=INTERVAL_COLS)], ignore_index=True)
+
+
+# ---------------------- QUERY ----------------------
+
+def as_of(intervals: pd.DataFrame, when: str, store_id: str = None) -> pd.DataFrame:
+    """
+    Store states valid at `when` ('YYYY-MM-DD HH:MM:SS', or a date for end of that day).
+    Pass `store_id` to look up a single store.
+    """
+    if len(when) == 10:
+        when = f'{when} 23:59:59'
+
+    if store_id is not None:
+        intervals = intervals[intervals['StoreID'] == store_id]
+
+    valid = (intervals['valid_from'] <= when) & (intervals['valid_to'].isna() | (intervals['valid_to'] > when))
+
+    return intervals[valid].reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    import main
+
+    store = main.start_run()
+
+    snapshots = load_snapshots(store)
+    intervals = build_intervals(snapshots)
+    save_intervals(store, intervals)
+
+    snapshot_bytes = len(snapshots.to_json(orient='records').encode('utf-8'))
+    interval_bytes = len(store.read_bytes(INTERVALS_FILE))
+    print(f"{len(snapshots)} snapshot rows -> {len(intervals)} intervals "
+          f"({snapshot_bytes / 1024:.0f} KB as JSON -> {interval_bytes / 1024:.0f} KB stored)")
@@ -0,0 +1,187 @@
+"""
+Date-partitioned history store for the op-shop scraper.
+
+History used to live in a single `stores_history.json` blob that was downloaded,
+appended to and re-uploaded on every run. This module instead writes one small
+gzip-compressed NDJSON partition per run and keeps a manifest of partitions:
+
+    history/manifest.json
+    history/date=YYYY-MM-DD/part-HHMMSS.ndjson.gz
+
+- Writes cost O(rows in this run) plus a manifest rewrite (one entry per run)
+- Partitions of migrated legacy runs hold every store of the run; runs since
+  the interval table (history_intervals) write only their changed rows and
+  are marked `changes_only` in the manifest
+- Readers can select partitions by date, or skip partitions with no changes
+- The legacy blob is split into partitions once, the first time it is seen
+
+All bucket access goes through a `run_storage.RunStorage`.
+"""
+
+import io
+import gzip
+from datetime import datetime
+
+import pandas as pd
+from google.api_core.exceptions import NotFound
+
+from run_storage import decompress
+
+HISTORY_PREFIX = 'history'
+MANIFEST_FILE = f'{HISTORY_PREFIX}/manifest.json'
+LEGACY_HISTORY_FILE = 'stores_history.json'
+
+
+# ---------------------- MANIFEST ----------------------
+
+def load_manifest(store) -> dict:
+    """
+    Load the partition manifest.
+    If no manifest exists yet, the legacy history blob is migrated first.
+    """
+    try:
+        return store.read_json(MANIFEST_FILE)
+    except NotFound:
+        pass
+
+    manifest = {'partitions': []}
+    migrate_legacy_history(store, manifest)
+
+    return manifest
+
+
+def save_manifest(store, manifest: dict):
+    """Upload the partition manifest (guarded against concurrent runs)."""
+    store.write_json(MANIFEST_FILE, manifest)
+
+
+# ---------------------- PARTITIONS ----------------------
+
+def partition_path(run_time: datetime) -> str:
+    """Blob path of the partition written by a run at `run_time`."""
+    return f"{HISTORY_PREFIX}/date={run_time:%Y-%m-%d}/part-{run_time:%H%M%S}.ndjson.gz"
+
+
+def write_partition(store, data: pd.DataFrame, run_time: datetime, manifest: dict = None,
+                    changes_only: bool = False, save: bool = True) -> dict:
+    """
+    Write one run's rows as a new partition and register it in the manifest.
+    Only today's rows are serialized; existing partitions are never touched.
+    Pass `changes_only` when `data` is only the run's changed rows, and
+    `save=False` when writing many partitions (then call `save_manifest` once).
+    Returns the manifest entry for the new partition.
+    """
+    if manifest is None:
+        manifest = load_manifest(store)
+
+    path = partition_path(run_time)
+    payload = data.to_json(orient='records', lines=True, date_format='iso')
+
+    store.write(
+        path,
+        gzip.compress(payload.encode('utf-8')),
+        content_type='application/x-ndjson',
+        content_encoding='gzip'
+    )
+
+    changed_rows = int(data['change_flag'].fillna(False).astype(bool).sum()) if 'change_flag' in data else 0
+    entry = {
+        'date': f"{run_time:%Y-%m-%d}",
+        'path': path,
+        'rows': len(data),
+        'changed_rows': changed_rows,
+        'changes_only': changes_only,
+    }
+
+    # A rerun within the same second replaces its own entry
+    manifest['partitions'] = [p for p in manifest['partitions'] if p['path'] != path]
+    manifest['partitions'].append(entry)
+    manifest['partitions'].sort(key=lambda p: p['path'])
+    if save:
+        save_manifest(store, manifest)
+
+    return entry
+
+
+def is_full_run(entry: dict) -> bool:
+    """
+    Whether a partition holds every store of its run, not just the changed ones.
+    Entries written before the `changes_only` flag count as full runs unless
+    every row in them is a change.
+    """
+    if 'changes_only' in entry:
+        return not entry['changes_only']
+    return entry['rows'] > entry.get('changed_rows', 0)
+
+
+def read_partition(store, path: str) -> pd.DataFrame:
+    """Download and decode a single partition."""
+    content = decompress(store.read_bytes(path))
+
+    if not content.strip():
+        return pd.DataFrame()
+
+    # dtype/convert_dates off so IDs like '0715' and date strings survive untouched
+    return pd.read_json(io.BytesIO(content), lines=True, dtype=False, convert_dates=False)
+
+
+def read_history(store, since: str = None, until: str = None, changed_only: bool = False,
+                 manifest: dict = None) -> pd.DataFrame:
+    """
+    Load history rows from the partitions a reader actually needs.
+    - since: only partitions dated on/after this 'YYYY-MM-DD' date
+    - until: only partitions dated before this 'YYYY-MM-DD' date
+    - changed_only: skip partitions with no changes and keep only changed rows
+    """
+    if manifest is None:
+        manifest = load_manifest(store)
+
+    frames = []
+    for entry in manifest['partitions']:
+        if since and entry['date'] < since:
+            continue
+        if until and entry['date'] >= until:
+            continue
+        if changed_only and not entry.get('changed_rows'):
+            continue
+
+        part = read_partition(store, entry['path'])
+        if changed_only and not part.empty:
+            part = part[part['change_flag'] == True]
+        frames.append(part)
+
+    if not frames:
+        return pd.DataFrame()
+
+    return pd.concat(frames, axis=0, ignore_index=True)
+
+
+# ---------------------- MIGRATION ----------------------
+
+def migrate_legacy_history(store, manifest: dict):
+    """
+    Split the legacy single-blob history into per-run partitions.
+    The legacy blob is left in place so the migration can be re-run if needed.
+    """
+    try:
+        hist = store.read_json(LEGACY_HISTORY_FILE)
+    except NotFound:
+        return
+
+    print(f"Migrating {LEGACY_HISTORY_FILE} to partitioned history")
+
+    hist_df = pd.DataFrame(hist).rename(columns={'Columns Changed': 'columns_changed'})
+    if hist_df.empty:
+        return
+
+    for run_date, run_df in hist_df.groupby('Date', sort=True):
+        write_partition(
+            store,
+            run_df.reset_index(drop=True),
+            datetime.strptime(run_date, "%Y-%m-%d %H:%M:%S"),
+            manifest=manifest,
+            save=False
+        )
+
+    # One manifest upload for the whole migration, not one per legacy run
+    save_manifest(store, manifest)
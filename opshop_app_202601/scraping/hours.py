@@ -0,0 +1,185 @@
+"""
+Structured opening hours for op-shop stores.
+
+Free-text hours ("Monday: 09:00:00 to 17:00:00, ..." from Salvos, "Mon-Fri:
+9am-4.30pm\\r\\nSat, Sun: closed" from STC) are parsed into a fixed-width
+array of 14 int16 values: (open, close) minutes after midnight for Monday to
+Sunday.
+
+- Closed days are (0, 0)
+- Days the text doesn't mention, or that can't be parsed, are (-1, -1)
+
+Stacked into an (n_stores, 7, 2) matrix this supports vectorized queries such
+as "which stores are open on Saturday at 09:30?", and a structural diff that
+ignores formatting-only changes to the text.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+HOURS_MINUTES_COL = 'HoursMinutes'
+
+CLOSED = 0
+UNKNOWN = -1
+
+DAY_RE = r'mon(?:day)?|tue(?:s(?:day)?)?|wed(?:s|nesday)?|thu(?:r(?:s(?:day)?)?)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?'
+TIME_RE = r'\d{1,2}(?:[:.]\d{0,3})?(?::\d{2})?\s*(?:[ap]\.?m\.?)?'
+SEGMENT_RE = re.compile(
+    rf'(?P<days>\b(?:{DAY_RE})(?:\s*(?:-|–|to|,|and|&)\s*(?:{DAY_RE}))*)\s*:?\s*'
+    rf'(?P<hours>closed|(?P<open>{TIME_RE})\s*(?:-|–|to)\s*(?P<close>{TIME_RE}))',
+    re.IGNORECASE
+)
+DAY_TOKEN_RE = re.compile(rf'(?P<day>{DAY_RE})|(?P<range>-|–|to)', re.IGNORECASE)
+TIME_PARTS_RE = re.compile(r'(\d{1,2})(?:[:.](\d{0,3}))?(?::\d{2})?\s*([ap])?', re.IGNORECASE)
+
+
+# ---------------------- PARSING ----------------------
+
+def _day_index(token: str) -> int:
+    return [d[:3].lower() for d in DAYS].index(token[:3].lower())
+
+
+def _expand_days(spec: str) -> list:
+    """'Mon-Wed, Sun' -> [0, 1, 2, 6]"""
+    days = []
+    range_start = None
+
+    for m in DAY_TOKEN_RE.finditer(spec):
+        if m.group('range'):
+            range_start = days[-1] if days else None
+            continue
+
+        day = _day_index(m.group('day'))
+        if range_start is not None:
+            days += list(range(range_start + 1, day + 1)) if day > range_start else [day]
+            range_start = None
+        else:
+            days.append(day)
+
+    return days
+
+
+def _parse_time(text: str) -> tuple:
+    """'9.30am' -> (9, 30, 'a'); '17:00:00' -> (17, 0, None)"""
+    m = TIME_PARTS_RE.match(text.strip())
+    hour = int(m.group(1))
+    minute = int((m.group(2) or '0')[:2])
+    suffix = m.group(3).lower() if m.group(3) else None
+
+    return hour, min(minute, 59), suffix
+
+
+def _to_minutes(hour: int, minute: int, suffix: str) -> int:
+    if suffix == 'p' and hour < 12:
+        hour += 12
+    elif suffix == 'a' and hour == 12:
+        hour = 0
+    return hour * 60 + minute
+
+
+def _parse_range(open_text: str, close_text: str) -> tuple:
+    """Opening/closing minutes; a bare opening hour borrows the closing suffix ('11-4pm')."""
+    open_h, open_m, open_sfx = _parse_time(open_text)
+    close_h, close_m, close_sfx = _parse_time(close_text)
+
+    if open_sfx is None and close_sfx is not None:
+        open_sfx = close_sfx
+        if _to_minutes(open_h, open_m, open_sfx) >= _to_minutes(close_h, close_m, close_sfx):
+            open_sfx = 'a'
+
+    return _to_minutes(open_h, open_m, open_sfx), _to_minutes(close_h, close_m, close_sfx)
+
+
+def parse_hours(text: str) -> np.ndarray:
+    """
+    Parse free-text opening hours into a (7, 2) int16 array of open/close minutes.
+    Days that aren't mentioned stay UNKNOWN; 'closed' days are (0, 0).
+    """
+    minutes = np.full((7, 2), UNKNOWN, dtype=np.int16)
+
+    if not isinstance(text, str):
+        return minutes
+
+    for m in SEGMENT_RE.finditer(text):
+        if m.group('hours').lower() == 'closed':
+            value = (CLOSED, CLOSED)
+        else:
+            value = _parse_range(m.group('open'), m.group('close'))
+
+        for day in _expand_days(m.group('days')):
+            # First mention wins ("Sun: closed (Trading Sundays 10-4pm)")
+            if minutes[day, 0] == UNKNOWN:
+                minutes[day] = value
+
+    return minutes
+
+
+def hours_matrix(hours_text: pd.Series) -> np.ndarray:
+    """
+    Parse a Series of hours text into an (n, 7, 2) int16 matrix.
+    Each distinct text is parsed once.
+    """
+    codes, uniques = pd.factorize(hours_text.astype(object), use_na_sentinel=False)
+
+    if not len(uniques):
+        return np.empty((0, 7, 2), dtype=np.int16)
+
+    return np.stack([parse_hours(text) for text in uniques])[codes]
+
+
+def add_hours_minutes(data: pd.DataFrame) -> pd.DataFrame:
+    """Store the fixed-width open/close minutes next to the 'Hours' text."""
+    matrix = hours_matrix(data['Hours'])
+    data[HOURS_MINUTES_COL] = matrix.reshape(len(data), 14).tolist()
+
+    return data
+
+
+def stored_hours_matrix(data: pd.DataFrame) -> np.ndarray:
+    """(n, 7, 2) matrix from the stored HoursMinutes column, parsing text if it's missing."""
+    if HOURS_MINUTES_COL not in data or data[HOURS_MINUTES_COL].isna().any():
+        return hours_matrix(data['Hours'])
+
+    return np.asarray(data[HOURS_MINUTES_COL].tolist(), dtype=np.int16).reshape(len(data), 7, 2)
+
+
+# ---------------------- QUERIES ----------------------
+
+def open_at(matrix: np.ndarray, day: str, time: str) -> np.ndarray:
+    """
+    Boolean mask of stores open on `day` ('Saturday' / 'sat') at `time` ('09:30').
+    Stores with unknown hours for that day are reported as not open.
+    """
+    d = _day_index(day)
+    hour, minute = (int(x) for x in time.split(':')[:2])
+    t = hour * 60 + minute
+
+    opens = matrix[:, d, 0]
+    closes = matrix[:, d, 1]
+
+    return (opens <= t) & (t < closes) & (opens != UNKNOWN)
+
+
+def open_stores(data: pd.DataFrame, day: str, time: str) -> pd.DataFrame:
+    """Rows of `data` open on `day` at `time`, e.g. open_stores(df, 'Saturday', '09:30')."""
+    return data[open_at(stored_hours_matrix(data), day, time)]
+
+
+def hours_differ(new: pd.Series, old: pd.Series) -> np.ndarray:
+    """
+    Structural hours diff: True where the parsed schedules differ.
+    Formatting-only edits compare equal. If either side can't be parsed at
+    all, falls back to comparing the raw text.
+    """
+    new_m = hours_matrix(new)
+    old_m = hours_matrix(old)
+
+    differ = (new_m != old_m).any(axis=(1, 2))
+    unparsed = (new_m == UNKNOWN).all(axis=(1, 2)) | (old_m == UNKNOWN).all(axis=(1, 2))
+    text_differ = (new.astype(object) != old.astype(object)).to_numpy(dtype=bool)
+
+    return np.where(unparsed, text_differ, differ)
@@ -0,0 +1,130 @@
+"""
+Per-stage timing and memory instrumentation for scraper runs.
+
+    metrics = RunMetrics(run_time)
+    with metrics.stage('scrape') as st:
+        df = scrape()
+        st['rows_out'] = len(df)
+    df = metrics.run('check_changes', check_changes, df)
+    metrics.emit(store)
+
+Each stage records wall time, RSS at start/end, RSS delta, peak RSS (sampled
+in a background thread while the stage runs) and rows in/out. `emit` prints
+one structured JSON record for the run (Cloud Logging parses JSON lines) and
+optionally writes it to the bucket under `metrics/`.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import psutil
+
+METRICS_PREFIX = 'metrics'
+
+# Seconds between RSS samples while a stage runs
+SAMPLE_INTERVAL = 0.05
+
+
+def _rss_mb(process) -> float:
+    return process.memory_info().rss / 1024 ** 2
+
+
+class _PeakSampler:
+    """Polls RSS in a daemon thread and keeps the maximum."""
+
+    def __init__(self, process, interval: float = SAMPLE_INTERVAL):
+        self.process = process
+        self.interval = interval
+        self.peak = _rss_mb(process)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+
+    def _poll(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, _rss_mb(self.process))
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, _rss_mb(self.process))
+
+
+class RunMetrics:
+    """Collects stage records for one run and emits them as a single JSON record."""
+
+    def __init__(self, run_time: datetime = None, process=None, **extra):
+        self.run_time = run_time or datetime.now()
+        self.process = process or psutil.Process(os.getpid())
+        self.stages = []
+        self.extra = extra
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        """
+        Time a block. Yields the stage record; set `rows_out` on it if relevant.
+        Failed stages are recorded with their error and re-raised.
+        """
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        rss_start = _rss_mb(self.process)
+        start = time.perf_counter()
+        sampler = _PeakSampler(self.process)
+
+        try:
+            with sampler:
+                yield record
+        except Exception as e:
+            record['error'] = repr(e)
+            raise
+        finally:
+            # After the sampler stopped, so failed stages get their peak too
+            rss_end = _rss_mb(self.process)
+            record.update({
+                'seconds': round(time.perf_counter() - start, 4),
+                'rss_start_mb': round(rss_start, 1),
+                'rss_end_mb': round(rss_end, 1),
+                'rss_delta_mb': round(rss_end - rss_start, 1),
+                'peak_rss_mb': round(sampler.peak, 1),
+            })
+            self.stages.append(record)
+
+    def run(self, name: str, func, data=None, *args, **kwargs):
+        """Run `func(data, ...)` as a stage, recording rows in/out for DataFrames."""
+        rows_in = len(data) if data is not None else None
+
+        with self.stage(name, rows_in) as record:
+            result = func(data, *args, **kwargs) if data is not None else func(*args, **kwargs)
+            if hasattr(result, '__len__') and not isinstance(result, (str, tuple)):
+                record['rows_out'] = len(result)
+
+        return result
+
+    def record(self) -> dict:
+        """The structured record for the whole run."""
+        return {
+            'type': 'run_metrics',
+            'run_time': self.run_time.strftime("%Y-%m-%d %H:%M:%S"),
+            'total_seconds': round(time.perf_counter() - self.start, 4),
+            'peak_rss_mb': max((s.get('peak_rss_mb', 0) for s in self.stages), default=None),
+            'stages': self.stages,
+            **self.extra,
+        }
+
+    def emit(self, store=None) -> dict:
+        """Log the run record as one JSON line and, given a RunStorage, save it under metrics/."""
+        record = self.record()
+        print(json.dumps(record))
+
+        if store is not None:
+            path = f"{METRICS_PREFIX}/date={self.run_time:%Y-%m-%d}/run-{self.run_time:%H%M%S}.json"
+            store.write_json(path, record, compress=False)
+
+        return record
@@ -0,0 +1,93 @@
+"""
+Local-directory stand-in for a GCS bucket.
+
+Implements the subset of the google-cloud-storage Bucket/Blob API the op-shop
+pipeline uses (blob(), reload, download_as_bytes/text, upload_from_string
+with if_generation_match), so the full pipeline can run offline for benchmarks
+and payload testing. Blob generations are the files' mtime in nanoseconds.
+
+Enable it for main.py by setting OPSHOP_LOCAL_STORAGE to a directory.
+"""
+
+import os
+import threading
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+
+class LocalBlob:
+
+    def __init__(self, bucket, name: str):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.root, *name.split('/'))
+        self.generation = None
+        self.content_type = None
+        self.content_encoding = None
+
+    def _current_generation(self) -> int:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def reload(self):
+        if not self.exists():
+            raise NotFound(f"{self.name} not found in {self.bucket.root}")
+        self.generation = self._current_generation()
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise NotFound(f"{self.name} not found in {self.bucket.root}")
+
+        self.generation = self._current_generation()
+        return data
+
+    def download_as_text(self, **kwargs) -> str:
+        return self.download_as_bytes().decode('utf-8')
+
+    download_as_string = download_as_bytes
+
+    def upload_from_string(self, data, content_type: str = None, if_generation_match=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        with self.bucket.lock:
+            if if_generation_match is not None and int(if_generation_match) != self._current_generation():
+                raise PreconditionFailed(f"{self.name}: generation does not match {if_generation_match}")
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'wb') as f:
+                f.write(data)
+
+            self.generation = self._current_generation()
+
+        self.content_type = content_type
+
+
+class LocalBucket:
+
+    def __init__(self, root: str):
+        self.root = root
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def total_bytes(self, prefix: str = '') -> int:
+        """Size on disk of all blobs whose name starts with `prefix`."""
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if name.startswith(prefix):
+                    total += os.path.getsize(path)
+        return total
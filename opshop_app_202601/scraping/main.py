@@ -6,139 +6,275 @@ geocodes addresses, detects changes to store information (hours/address),
 flags recent changes, and saves current and historical records to JSON files.
 
 Key features:
-- Salvos: scraped using Selenium due to API restrictions
+- Salvos: store-list API over HTTP with a cached browser session;
+  Selenium only bootstraps the session when it is missing or rejected
 - Save the Children: scraped via their API
-- Geocoding with caching
-- Detect changes in store hours or addresses
+- Batch geocoding (rate-limited worker pool) with caching
+- Detect changes in store hours (structurally, ignoring formatting) or addresses
+- Parse hours into per-day open/close minutes for "open at" queries
 - Track last changes per store
 - Flag changes within last 7 days
-- Save current and historical data in JSON
+- Save current data in JSON and history as date-partitioned NDJSON
+- Publish a numbered per-run delta feed (changed/added/removed stores)
+- Flag co-located stores across chains and coordinate outliers (grid index)
+- Storage client, geocoder, geocode cache and Selenium are created on first
+  use and kept warm across invocations (profile imports: profile_imports.py)
 """
 
 import os
-import re
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from datetime import datetime, timedelta
 
 import pandas as pd
 import requests
-from geopy.geocoders import Nominatim
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from google.cloud import storage
+from requests.adapters import HTTPAdapter
 from google.api_core.exceptions import NotFound
 import psutil
 
+import addresses
+import history_store
+import history_intervals
+import change_index
+import change_detection
+import delta_feed
+import geocoding
+import hours
+import spatial
+from run_storage import RunStorage
+from gazetteer import Gazetteer
+from instrumentation import RunMetrics
+from local_storage import LocalBucket
+
 process = psutil.Process(os.getpid())
 
 # ---------------------- GLOBAL CONFIG ----------------------
 NOW = datetime.now()
 FORMATTED_NOW = NOW.strftime("%Y-%m-%d %H:%M:%S")
 
-# Cache file for geocoding to avoid repeated API calls
-GEOCODE_CACHE_FILE = 'geocode_cache.json'
-client = storage.Client()
-bucket = client.bucket("op-shop-data")
-blob = bucket.blob(GEOCODE_CACHE_FILE)
+# Created on first use (see the get_* helpers) and kept warm across invocations
+bucket = None
+geocode_cache = None
+geolocator = None
+gazetteer = None
+
+# Run-scoped storage view, set by start_run
+store = None
+
+# Pooled HTTP client shared by the API scrapers
+http = requests.Session()
+http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# Salvos store list; the API only answers clients holding a browser session
+SALVOS_STORES_PAGE = "https://www.salvosstores.com.au/stores"
+SALVOS_STORE_LIST_API = "https://www.salvosstores.com.au/api/uplister/store-list"
+SALVOS_SESSION_FILE = 'salvos_session.json'
+SALVOS_STORE_FIELDS = ['StoreID', 'Name', 'FullAddress']
+
+# ---------------------- LAZY CLIENTS ----------------------
+
+def get_bucket():
+    """
+    One storage bucket per instance; reads/writes go through a run-scoped
+    RunStorage (see start_run) so each blob is downloaded at most once per run.
+    """
+    global bucket
+    if bucket is None:
+        if os.environ.get('OPSHOP_LOCAL_STORAGE'):
+            # Offline runs (benchmarks, payload tests) against a local directory
+            bucket = LocalBucket(os.environ['OPSHOP_LOCAL_STORAGE'])
+        else:
+            from google.cloud import storage
+            bucket = storage.Client().bucket("op-shop-data")
+    return bucket
+
+
+def get_geocode_cache():
+    """
+    Geocode cache (SQLite, synced to GCS), downloaded the first time a scraper
+    geocodes and again after it went stale (a lost upload race, see GeocodeCache.sync).
+    """
+    global geocode_cache
+    if geocode_cache is None or geocode_cache.stale:
+        # Not closed: scraper threads may still hold the old one
+        geocode_cache = geocoding.GeocodeCache.from_store(store)
+    return geocode_cache
+
 
-if blob.exists():
-    print(f"Loading {GEOCODE_CACHE_FILE} from GCS")
-    content = blob.download_as_text()
-    geocode_cache = json.loads(content)
-else:
-    print(f"File {GEOCODE_CACHE_FILE} does not exist yet")
-    geocode_cache = {}
+def get_geolocator():
+    global geolocator
+    if geolocator is None:
+        from geopy.geocoders import Nominatim
+        geolocator = Nominatim(user_agent="opshop_locator")
+    return geolocator
+
+
+def get_gazetteer():
+    """Bundled suburb/postcode centroids, tried before the network."""
+    global gazetteer
+    if gazetteer is None:
+        gazetteer = Gazetteer.load()
+    return gazetteer
 
-geolocator = Nominatim(user_agent="opshop_locator")
 
 # ---------------------- HELPER FUNCTIONS ----------------------
 
 def get_latlon(address: str):
     """
     Retrieve latitude and longitude for a given address.
-    Checks a local cache first to reduce API calls.
+    Checks the cache, then the gazetteer, then the geocoder; new results are
+    cached but not synced (see save_geocode_cache).
     """
-    if address in geocode_cache:
-        return geocode_cache[address]
+    latlons = geocoding.batch_geocode([address], get_geocode_cache(), get_geolocator(), gazetteer=get_gazetteer())
+
+    return latlons.get(address, (None, None))
 
-    location = geolocator.geocode(address, timeout=10)
-    
-    # Retry with simplified address if first attempt fails
-    if not location and ',' in address:
-        parts = address.split(',', 1)
-        location = geolocator.geocode(parts[1].strip(), timeout=10)
 
-    if location:
-        latlon = (location.latitude, location.longitude)
-    else:
-        latlon = (None, None)
+def save_geocode_cache():
+    """Upload the geocode cache back to GCS and log its hit rate."""
+    cache = get_geocode_cache()
+    print(f"Geocode cache: {cache.stats()}")
+    cache.sync(store)
+
+
+# ---------------------- SCRAPERS ----------------------
+
+def bootstrap_salvos_session() -> tuple:
+    """
+    Open the Salvos store page in headless Chrome.
+    Returns the session (cookies + user agent) and the store list fetched in-page.
+    """
+    # Selenium is only needed when the cached session is missing or rejected
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    driver = webdriver.Chrome(options=chrome_options)
 
-    # Save result to cache
-    geocode_cache[address] = latlon
-    with open(GEOCODE_CACHE_FILE, 'w') as f:
-        json.dump(geocode_cache, f, indent=2)
+    try:
+        driver.get(SALVOS_STORES_PAGE)
+
+        # Fetch the store list JSON via JavaScript
+        salvos_stores = driver.execute_script("""
+            return fetch('/api/uplister/store-list')
+                .then(response => response.json())
+        """)
+
+        session = {
+            'created': FORMATTED_NOW,
+            'user_agent': driver.execute_script("return navigator.userAgent"),
+            'cookies': [
+                {k: c[k] for k in ('name', 'value', 'domain', 'path') if k in c}
+                for c in driver.get_cookies()
+            ]
+        }
+    finally:
+        driver.quit()
+
+    return session, salvos_stores
+
+
+def load_salvos_session() -> dict:
+    """Load the cached Salvos browser session from GCS, if any."""
+    try:
+        return store.read_json(SALVOS_SESSION_FILE)
+    except NotFound:
+        print(f"File {SALVOS_SESSION_FILE} does not exist yet")
+        return None
 
 
-    return latlon
+def save_salvos_session(session: dict):
+    """Persist the Salvos browser session to GCS."""
+    store.write_json(SALVOS_SESSION_FILE, session)
 
 
-def format_address(addr: str) -> str:
+def is_salvos_store_list(payload) -> bool:
     """
-    Clean and standardize raw address strings.
-    - Expands common abbreviations
-    - Moves unit/shop prefixes
-    - Ensures country is appended
+    Whether an API answer is the store list ({id: {StoreID, Name, FullAddress, ...}})
+    rather than an error payload such as {"error": "..."} or [].
     """
-    if not addr:
-        return ''
+    return (
+        isinstance(payload, dict) and len(payload) > 0
+        and all(isinstance(s, dict) and all(f in s for f in SALVOS_STORE_FIELDS) for s in payload.values())
+    )
+
 
-    addr = re.sub(r'\r?\n\s*\((.*?)\)', r', \1', addr)  # newline + parentheses
-    addr = re.sub(r'\s*\((.*?)\)', r', \1', addr)       # parentheses
-    addr = re.sub(r'\bCnr\b', 'Corner of', addr, flags=re.IGNORECASE)  # Cnr -> Corner
-    addr = re.sub(r'^\d+/\s*', '', addr)  # remove unit/shop prefixes
-    addr = re.sub(r',\s*,+', ',', addr).strip(', ')  # clean trailing commas
+def fetch_salvos_store_list(session: dict):
+    """
+    Call the Salvos store-list API over the pooled HTTP client using a cached session.
+    Returns None if the session is rejected or the answer is not a store list.
+    """
+    cookies = requests.cookies.RequestsCookieJar()
+    for c in session['cookies']:
+        cookies.set(c['name'], c['value'], domain=c.get('domain'), path=c.get('path', '/'))
 
-    if 'Australia' not in addr:
-        addr += ', Australia'
+    headers = {
+        "User-Agent": session['user_agent'],
+        "Referer": SALVOS_STORES_PAGE,
+        "Accept": "application/json",
+    }
 
+    try:
+        resp = http.get(SALVOS_STORE_LIST_API, headers=headers, cookies=cookies, timeout=30)
+        resp.raise_for_status()
+        payload = resp.json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Cached Salvos session rejected: {e}")
+        return None
 
-    return addr.strip()
+    if not is_salvos_store_list(payload):
+        print(f"Cached Salvos session got no store list: {str(payload)[:200]}")
+        return None
 
+    return payload
 
-# ---------------------- SCRAPERS ----------------------
 
 def get_salvos_stores() -> list:
     """
-    Scrape Salvos stores using Selenium (API blocked).
+    Fetch Salvos stores from their store-list API.
+    - Uses the cached browser session over plain HTTP when possible
+    - Falls back to a Selenium bootstrap (API blocks bare clients) and caches that session
     Returns a list of dictionaries with store info.
     """
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    driver = webdriver.Chrome(options=chrome_options)
+    salvos_stores = None
 
-    driver.get("https://www.salvosstores.com.au/stores")
+    session = load_salvos_session()
+    if session:
+        salvos_stores = fetch_salvos_store_list(session)
 
-    # Fetch the store list JSON via JavaScript
-    salvos_stores = driver.execute_script("""
-        return fetch('/api/uplister/store-list')
-            .then(response => response.json())
-    """)
+    if salvos_stores is None:
+        print("Bootstrapping Salvos session with Selenium")
+        session, salvos_stores = bootstrap_salvos_session()
+        if not is_salvos_store_list(salvos_stores):
+            raise ValueError(f"Salvos store list unavailable: {str(salvos_stores)[:200]}")
+        save_salvos_session(session)
 
     print(f"Total Salvos stores found: {len(salvos_stores)}")
-    driver.quit()
 
     store_data = []
     days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
-    for store in salvos_stores.values():
-        store_id = store['StoreID']
-        name = store['Name']
-        address = store['FullAddress']
-        lat = store.get('Latitude', None)
-        lon = store.get('Longitude', None)
-
-        if 'OpeningHours' in store:
-            oh = store['OpeningHours']
+    centroids = get_gazetteer()
+
+    for item in salvos_stores.values():
+        store_id = item['StoreID']
+        name = item['Name']
+        address = item['FullAddress']
+        lat = item.get('Latitude', None)
+        lon = item.get('Longitude', None)
+
+        # Fall back to the suburb/postcode centroid when the API has no location
+        approximate = False
+        if (lat is None or lon is None) and centroids is not None:
+            latlon = centroids.locate(address)
+            if latlon is not None:
+                lat, lon = latlon
+                approximate = True
+
+        if 'OpeningHours' in item:
+            oh = item['OpeningHours']
             hours = {day: f"{oh[day]['Opening']} to {oh[day]['Closing']}" 
                      if isinstance(oh[day], dict) else 'Closed' for day in days}
         else:
@@ -152,7 +288,8 @@ def get_salvos_stores() -> list:
             'Address': address,
             'Latitude': lat,
             'Longitude': lon,
-            'Hours': ', '.join(f"{k}: {v}" for k, v in hours.items())
+            'Hours': ', '.join(f"{k}: {v}" for k, v in hours.items()),
+            'LocationApproximate': approximate
         })
 
 
@@ -171,94 +308,209 @@ def get_stc_stores() -> list:
         "Referer": "https://www.savethechildren.org.au/",
     }
 
-    resp = requests.get(url, headers=headers)
+    resp = http.get(url, headers=headers)
     store_list = resp.json()['data']['contentData']
 
+    # Normalize all addresses in one pass; IDs use the canonical key so
+    # case/abbreviation/whitespace edits don't turn into a "new" store
+    excerpts = pd.Series([item['excerpt'] for item in store_list], dtype=object)
+    formatted = addresses.format_addresses(excerpts)
+    keys = addresses.canonical_address_keys(formatted)
+
+    # Geocode all cache misses in one rate-limited batch, then sync once.
+    # Gazetteer centroids are flagged approximate.
+    approximate = set()
+    latlons = geocoding.batch_geocode(formatted, get_geocode_cache(), get_geolocator(),
+                                      gazetteer=get_gazetteer(), approximate=approximate)
+    save_geocode_cache()
+
     store_data = []
-    for item in store_list:
+    for item, address, key in zip(store_list, formatted, keys):
         name = item['title']
-        address = format_address(item['excerpt'])
-        lat, lon = get_latlon(address)
+        lat, lon = latlons.get(address, (None, None))
         hours = item.get('hours', '')
 
         store_data.append({
             'Date': FORMATTED_NOW,
             'Store': 'Save The Children',
-            'StoreID': 'STC-' + address,
+            'StoreID': addresses.STC_ID_PREFIX + key,
             'Suburb': name,
             'Address': address,
             'Latitude': lat,
             'Longitude': lon,
-            'Hours': hours
+            'Hours': hours,
+            'LocationApproximate': address in approximate
         })
 
 
     return store_data
 
 
+# ---------------------- CHAIN REGISTRY ----------------------
+
+# Columns every chain scraper returns
+STORE_COLUMNS = ['Date', 'Store', 'StoreID', 'Suburb', 'Address', 'Latitude', 'Longitude', 'Hours', 'LocationApproximate']
+
+COORDINATE_COLUMNS = ['Latitude', 'Longitude']
+
+# ~0.5 m resolution at Australian latitudes, half the memory of float64
+COORDINATE_DTYPE = 'float32'
+
+# Chain name -> (scraper, timeout in seconds). Add new chains here.
+STORE_SCRAPERS = {
+    'Salvos': (get_salvos_stores, 300),
+    'Save The Children': (get_stc_stores, 600),
+}
+
+
+def run_scraper(scraper) -> tuple:
+    """Run one chain scraper, returning its records and wall time."""
+    start = time.perf_counter()
+    records = scraper()
+    return records, time.perf_counter() - start
+
+
+def scrape_chains(scrapers: dict = STORE_SCRAPERS) -> tuple:
+    """
+    Run all registered chain scrapers concurrently.
+    - Each chain gets its own timeout, measured from the start of the run
+    - A chain that fails or times out is logged and skipped; the others are kept
+      (its previous rows are carried forward at save time, see carry_forward_failed_chains)
+    Returns the combined DataFrame and per-chain stats (status, records, seconds).
+    """
+    start = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=len(scrapers), thread_name_prefix='scraper')
+    futures = {name: pool.submit(run_scraper, scraper) for name, (scraper, _) in scrapers.items()}
+
+    all_stores = []
+    chain_stats = []
+    for name, future in futures.items():
+        timeout = scrapers[name][1]
+        stats = {'chain': name, 'status': 'ok', 'records': 0, 'seconds': None}
+
+        try:
+            records, seconds = future.result(timeout=max(0, start + timeout - time.perf_counter()))
+            all_stores += records
+            stats.update(records=len(records), seconds=round(seconds, 3))
+        except FuturesTimeout:
+            stats.update(status='timeout', seconds=timeout)
+        except Exception as e:
+            stats.update(status=f'error: {e!r}', seconds=round(time.perf_counter() - start, 3))
+
+        print(f"Scraper {name}: {stats}")
+        chain_stats.append(stats)
+
+    # Don't wait on chains that timed out
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    df = pd.json_normalize(all_stores).reindex(columns=STORE_COLUMNS)
+
+    return df, chain_stats
+
+
 # ---------------------- DATA STORAGE ----------------------
 
+def carry_forward_failed_chains(data: pd.DataFrame, chain_stats: list) -> pd.DataFrame:
+    """
+    Add the previous snapshot's rows for chains that failed or timed out this run.
+    Only chains scraped this run are authoritative (as in history_intervals),
+    so a failed chain keeps its stores in stores_current.json and the delta
+    feed instead of being published as removed.
+    """
+    failed = [s['chain'] for s in chain_stats if s['status'] != 'ok']
+    if not failed:
+        return data
+
+    try:
+        previous = pd.DataFrame(store.read_json('stores_current.json'))
+    except NotFound:
+        return data
+
+    if previous.empty:
+        return data
+
+    carried = previous[previous['Store'].isin(failed)].copy()
+    carried['StoreID'] = addresses.canonical_store_ids(carried['StoreID'])
+    carried['change_flag'] = False
+
+    print(f"Carrying forward {len(carried)} previous rows for failed chains: {failed}")
+
+    return pd.concat([data, carried.reindex(columns=data.columns)], ignore_index=True)
+
+
 def save_current(data: pd.DataFrame, filename='stores_current.json'):
     """Save current scraped data to JSON."""
     # with open(filename, 'w') as f:
     #     json.dump(data.to_dict(orient='records'), f, indent=2)
 
 
-    client = storage.Client()
-    bucket = client.bucket('op-shop-data')
-    blob = bucket.blob('stores_current.json')
-
     print(f'df columns: {data.columns}')
     print(f'df shape: {data.shape}')
 
-    blob.upload_from_string(
-        json.dumps(data.to_dict(orient='records'), indent=2),
-        content_type='application/json'
-    )
+    # Compact gzip JSON (Content-Encoding: gzip), guarded by the generation read in check_changes
+    store.write_json('stores_current.json', data.to_json(orient='records'))
 
 
 
 def save_history(data: pd.DataFrame, filename='stores_history.json'):
-    """Append new data to history JSON file."""
+    """
+    Record this run in the history:
+    - Interval table: opens/closes intervals only for stores whose state changed
+    - A partition with just this run's changed rows (the change log)
+    - The per-store change index
+    """
 
-    records = data.to_dict(orient='records')
+    intervals = history_intervals.load_intervals(store)
+    intervals = history_intervals.update_intervals(intervals, data, FORMATTED_NOW)
+    history_intervals.save_intervals(store, intervals)
+    print(f"History intervals: {len(intervals)} ({intervals['valid_to'].isna().sum()} open)")
 
-    client = storage.Client()
-    bucket = client.bucket('op-shop-data')
-    blob = bucket.blob('stores_history.json')
+    entry = history_store.write_partition(store, data[data['change_flag'] == True], NOW, changes_only=True)
+    print(f"Saved {entry['rows']} changed rows to {entry['path']}")
 
+    # Keep the per-store change index in step with the partitions
+    index = change_index.load_change_index(store)
+    change_index.rekey_change_index(index, addresses.canonical_store_ids)
+    change_index.update_change_index(index, data)
+    change_index.save_change_index(store, index)
+
+
+def load_previous_snapshot() -> tuple:
+    """The stores_current.json this run replaces (canonical IDs) and its generation."""
     try:
-        existing = blob.download_as_string()
-        hist = json.loads(existing)
+        previous = pd.DataFrame(store.read_json('stores_current.json'))
     except NotFound:
-        hist = []
+        previous = pd.DataFrame(columns=['StoreID'])
 
-    hist += records
+    if not previous.empty:
+        previous['StoreID'] = addresses.canonical_store_ids(previous['StoreID'])
 
-    blob.upload_from_string(
-        json.dumps(hist, indent=2),
-        content_type='application/json'
-    )
+    return previous, store.generation('stores_current.json')
+
+
+def save_delta(data: pd.DataFrame, previous: pd.DataFrame, previous_generation):
+    """
+    Publish this run's changes against the snapshot it replaced as the next
+    numbered delta (see delta_feed).
+    Runs after save_current, so a feed failure never holds back the snapshot.
+    """
+    delta_feed.publish_delta(store, data, previous, FORMATTED_NOW,
+                             previous_generation, store.generation('stores_current.json'))
 
 
 
 # ---------------------- CHANGE DETECTION ----------------------
 
-def check_changes(data: pd.DataFrame) -> pd.DataFrame:
+def check_changes(data: pd.DataFrame, check_cols: list = change_detection.CHECK_COLS) -> pd.DataFrame:
     """
     Compare current scrape to last scrape to detect changes.
-    Flags stores with differences in 'Hours' or 'Address'.
+    Flags stores with differences in any of `check_cols` (default 'Address', 'Hours').
     """
 
-    client = storage.Client()
-    bucket = client.bucket("op-shop-data")
-    blob = bucket.blob("stores_current.json")
-
-    if blob.exists():
+    try:
         print(f"Loading stores_current.json from GCS")
-        content = blob.download_as_text()
-        stores_current = json.loads(content)
-    else:
+        stores_current = store.read_json("stores_current.json")
+    except NotFound:
         print(f"File stores_current.json does not exist yet")
         stores_current = []
 
@@ -268,6 +520,9 @@ def check_changes(data: pd.DataFrame) -> pd.DataFrame:
     # Make DataFrame with expected columns even if empty
     stores_current_df = pd.DataFrame(stores_current, columns=expected_cols)
 
+    # Previous runs used raw formatted addresses for STC IDs
+    stores_current_df['StoreID'] = addresses.canonical_store_ids(stores_current_df['StoreID'])
+
     # Merge current scrape with previous data
     merged_df = data.merge(
         stores_current_df, 
@@ -276,27 +531,14 @@ def check_changes(data: pd.DataFrame) -> pd.DataFrame:
         suffixes=('_new', '_old')
     )
 
-    check_cols = ['Address', 'Hours']
-
-    def detect_changes(row):
-        """Detect which columns changed."""
-        changed_cols = [col for col in check_cols 
-                        if row[f"{col}_new"] != row[f"{col}_old"] 
-                        and not pd.isna(row[f"{col}_old"])]
-        row['change_flag'] = bool(changed_cols)
-        row['columns_changed'] = ', '.join(
-            f"{col} before: {row[f'{col}_old']}\n{col} after: {row[f'{col}_new']}"
-            for col in changed_cols
-        )
-        return row
-
-    merged_df = merged_df.apply(detect_changes, axis=1)
+    # Vectorized diff over the configured columns
+    merged_df = change_detection.detect_changes(merged_df, check_cols)
 
     # Keep only relevant columns and rename to original names
     result_df = merged_df[[
         'Date_new', 'Store', 'StoreID', 'Suburb', 
         'Address_new', 'Latitude_new', 'Longitude_new', 
-        'Hours_new', 'change_flag', 'columns_changed'
+        'Hours_new', 'LocationApproximate', 'change_flag', 'columns_changed'
     ]].rename(columns={
         'Date_new': 'Date', 
         'Address_new': 'Address',
@@ -316,43 +558,20 @@ def check_history_changes(data: pd.DataFrame) -> pd.DataFrame:
     Tracks:
     - Stores that had any changes in the last 7 days
     - Most recent change per store
+    Uses the per-store change index, so cost scales with stores, not history.
     """
 
-    # Load historical data
-    client = storage.Client()
-    bucket = client.bucket("op-shop-data")
-    blob = bucket.blob("stores_history.json")
-
-    if blob.exists():
-        print("Loading stores_history.json from GCS")
-        content = blob.download_as_text()
-        hist = json.loads(content)
-    else:
-        print("File stores_history.json does not exist yet")
-        hist = []
-
-    hist_df = pd.DataFrame(hist)
-    all_data = pd.concat([data, hist_df], axis=0, ignore_index=True)
-
-    # Most recent change per store
-    last_changes = all_data[all_data['change_flag'] == True]
-    idx = last_changes.groupby('StoreID')['Date'].idxmax()
-    last_changes = last_changes.loc[idx, ['StoreID', 'Date', 'columns_changed']]
-    last_changes = last_changes.rename(columns={
-        'Date': 'Last Change Date',
-        'columns_changed': 'Last Columns Changed'
-    })
+    # Fold today's changes into the index (persisted later by save_history)
+    index = change_index.load_change_index(store)
+    change_index.rekey_change_index(index, addresses.canonical_store_ids)
+    change_index.update_change_index(index, data)
 
-    # Flag stores with changes in last 7 days
     cutoff_date = (datetime.now() - timedelta(days=7)).date()
-    all_data['Date'] = pd.to_datetime(all_data['Date']).dt.date
-    recent_data = all_data[all_data['Date'] >= cutoff_date]
-    store_changes = recent_data.groupby('StoreID')['change_flag'].any().reset_index()
-    store_changes.rename(columns={'change_flag': 'change_in_last_7_days'}, inplace=True)
+    store_changes = change_index.change_flags(index, cutoff_date.isoformat())
 
     # Merge flags and last change info back to current data
     data = data.merge(store_changes, on='StoreID', how='left')
-    data = data.merge(last_changes, on='StoreID', how='left')
+    data['change_in_last_7_days'] = data['change_in_last_7_days'].fillna(False).astype(bool)
 
     # Ensure string types for JSON serialization
     data[['Last Change Date', 'Last Columns Changed']] = data[['Last Change Date', 'Last Columns Changed']].fillna('').astype(str)
@@ -366,11 +585,13 @@ def check_history_changes(data: pd.DataFrame) -> pd.DataFrame:
 def data_cleaning(data: pd.DataFrame) -> pd.DataFrame:
     """
     Clean latitude and longitude columns.
-    - Remove commas and convert to string
+    - Remove commas and convert to float32, missing/unparseable as null
+    - Locations not flagged approximate are exact
     """
 
-    data['Latitude'] = data['Latitude'].astype(str).str.replace(',', '')
-    data['Longitude'] = data['Longitude'].astype(str).str.replace(',', '')
+    for col in COORDINATE_COLUMNS:
+        data[col] = pd.to_numeric(data[col].astype(str).str.replace(',', ''), errors='coerce').astype(COORDINATE_DTYPE)
+    data['LocationApproximate'] = data.get('LocationApproximate', pd.Series(False, index=data.index)).fillna(False).astype(bool)
 
 
     return data
@@ -378,48 +599,96 @@ def data_cleaning(data: pd.DataFrame) -> pd.DataFrame:
 
 # ---------------------- MAIN FUNCTION ----------------------
 
+def start_run() -> RunStorage:
+    """
+    Start a new run on a warm instance:
+    - Fresh run-scoped storage view on the shared (lazily created) client
+    - Run timestamp reset, so rows and partitions aren't stamped with import time
+    - Geocode cache marked for re-download if another run uploaded a newer one
+    """
+    global store, NOW, FORMATTED_NOW
+    store = RunStorage(get_bucket())
+
+    if geocode_cache is not None and store.current_generation(geocode_cache.blob_name) != geocode_cache.generation:
+        print(f"{geocode_cache.blob_name} changed since it was loaded, reloading on next use")
+        geocode_cache.stale = True
+
+    NOW = datetime.now()
+    FORMATTED_NOW = NOW.strftime("%Y-%m-%d %H:%M:%S")
+    return store
+
+
 def main(request, PayloadTesting=False, payload=[]):
     """
     Master function to:
-    - Scrape all op shop chains
+    - Scrape all op shop chains (concurrently, see STORE_SCRAPERS)
     - Detect changes
     - Flag recent changes
     - Save current and historical data
+    - Emit per-stage timing/memory metrics (failed runs included)
     - Return combined DataFrame
     """
 
     
 
-    # Scrape stores
-    if PayloadTesting:
-        all_stores = payload
-    else:
-        salvos_data = get_salvos_stores()
-        stc_data = get_stc_stores()
-
-        # Combine into one DataFrame
-        all_stores = salvos_data + stc_data
-
-    df = pd.json_normalize(all_stores)
-
-    # Clean lat/lon
-    df = data_cleaning(df)
+    start_run()
+    metrics = RunMetrics(NOW, process)
 
-    # Detect changes from previous scrape
-    df = check_changes(df)
-
-    # Track last changes and recent changes
-    df = check_history_changes(df)
-
-    # Save historical data
-    save_history(df)
-
-    # Save current scrape 
-    save_current(df)
-
-    print("Memory at end:", process.memory_info().rss / 1024 ** 2, "MB")
-
-    return "Scraper run completed successfully", 200
+    # Metrics are emitted in `finally` so failed runs (and their errored stage) are recorded too
+    try:
+        # Scrape stores
+        with metrics.stage('scrape') as stage:
+            if PayloadTesting:
+                df = pd.json_normalize(payload)
+                chain_stats = []
+            else:
+                # All registered chains concurrently, combined into one DataFrame
+                df, chain_stats = scrape_chains()
+            stage['rows_out'] = len(df)
+            stage['chains'] = chain_stats
+
+        # Nothing scraped at all: keep the previous snapshot rather than blank it
+        if df.empty:
+            return f"All scrapers failed: {json.dumps(chain_stats)}", 500
+
+        # Clean lat/lon
+        df = metrics.run('clean', data_cleaning, df)
+
+        # Detect changes from previous scrape
+        df = metrics.run('check_changes', check_changes, df)
+
+        # Track last changes and recent changes
+        df = metrics.run('check_history_changes', check_history_changes, df)
+
+        # Fixed-width open/close minutes next to the hours text
+        df = metrics.run('parse_hours', hours.add_hours_minutes, df)
+
+        # Co-located stores across chains and implausible coordinates
+        df = metrics.run('spatial_flags', spatial.add_spatial_flags, df)
+
+        # Save historical data
+        metrics.run('save_history', save_history, df)
+
+        # Failed chains keep their previous rows in the published snapshot
+        df = metrics.run('carry_forward', carry_forward_failed_chains, df, chain_stats)
+
+        # Save current scrape, keeping the snapshot it replaces for the delta feed
+        previous, previous_generation = load_previous_snapshot()
+        metrics.run('save_current', save_current, df)
+
+        # Publish the per-run delta feed
+        metrics.run('save_delta', save_delta, df, previous, previous_generation)
+
+        return "Scraper run completed successfully", 200
+
+    finally:
+        # One structured record per run: logged and written to metrics/ in the bucket.
+        # A failure here is only logged, so it cannot replace the run's own error
+        try:
+            metrics.extra['storage'] = store.stats()
+            metrics.emit(store)
+        except Exception as e:
+            print(f"Run metrics not emitted: {e!r}")
 
 
 # ---------------------- RUN SCRIPT ----------------------
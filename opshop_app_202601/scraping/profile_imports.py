@@ -0,0 +1,119 @@
+"""
+Import-time profile of a Cloud Function entry point (cold-start cost).
+
+Imports the entry module in a fresh interpreter with `python -X importtime`
+and reports:
+
+- total import wall time
+- the entry module's direct imports by cumulative cost
+- self time summed per top-level package
+
+    python profile_imports.py                                   # this directory's main.py
+    python profile_imports.py --dir ../../metroford_202601/scraping
+    python profile_imports.py --json import_profile.json        # also save the report
+
+Run it a few times; the first run after a reboot includes disk cache misses.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+
+# "import time:      self [us] |  cumulative | imported package"
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$')
+
+
+def run_importtime(directory: str, module: str = 'main') -> tuple:
+    """Import `module` from `directory` in a subprocess; returns (wall seconds, importtime lines)."""
+    env = dict(os.environ)
+    # Keep the op-shop entry point off the network even if something initializes eagerly
+    env.setdefault('OPSHOP_LOCAL_STORAGE', tempfile.mkdtemp(prefix='opshop_import_'))
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=directory, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    return wall, result.stderr.splitlines()
+
+
+def parse_importtime(lines: list) -> list:
+    """(module, depth, self_us, cumulative_us) per imported module, in import order."""
+    rows = []
+    for line in lines:
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            self_us, cumulative_us, indent, name = m.groups()
+            rows.append((name, len(indent) // 2, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def build_report(wall: float, rows: list, module: str = 'main') -> dict:
+    entry = next((r for r in rows if r[0] == module), None)
+    entry_depth = entry[1] if entry else 0
+
+    # importtime prints children before their parent, so the entry module's
+    # direct imports are the rows one level deeper that precede it
+    direct = []
+    for name, depth, self_us, cumulative_us in rows:
+        if name == module:
+            break
+        if depth == entry_depth + 1:
+            direct.append({'module': name, 'cumulative_ms': round(cumulative_us / 1000, 1)})
+
+    packages = defaultdict(int)
+    for name, _, self_us, _ in rows:
+        packages[name.split('.')[0]] += self_us
+
+    return {
+        'module': module,
+        'wall_seconds': round(wall, 3),
+        'entry_cumulative_ms': round(entry[3] / 1000, 1) if entry else None,
+        'modules_imported': len(rows),
+        'direct_imports': sorted(direct, key=lambda d: -d['cumulative_ms']),
+        'packages': sorted(
+            ({'package': p, 'self_ms': round(us / 1000, 1)} for p, us in packages.items()),
+            key=lambda d: -d['self_ms']
+        ),
+    }
+
+
+def print_report(report: dict, top: int):
+    print(f"import {report['module']}: {report['entry_cumulative_ms']} ms cumulative, "
+          f"{report['wall_seconds']:.3f}s interpreter wall time, {report['modules_imported']} modules")
+
+    print(f"\n{'direct import':<40}{'cumulative ms':>15}")
+    for d in report['direct_imports'][:top]:
+        print(f"{d['module']:<40}{d['cumulative_ms']:>15.1f}")
+
+    print(f"\n{'package':<40}{'self ms':>15}")
+    for p in report['packages'][:top]:
+        print(f"{p['package']:<40}{p['self_ms']:>15.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    wall, lines = run_importtime(args.dir, args.module)
+    report = build_report(wall, parse_importtime(lines), args.module)
+    print_report(report, args.top)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
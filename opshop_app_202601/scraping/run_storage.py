@@ -0,0 +1,151 @@
+"""
+Run-scoped view of the op-shop GCS bucket.
+
+One `RunStorage` is created per scraper run on top of a single shared
+storage client/bucket:
+
+- Blob reads are memoized with their generation, so each blob is downloaded
+  at most once per run (missing blobs are remembered too)
+- Uploads of a blob read earlier in the run carry `if_generation_match`, so a
+  concurrent run that rewrote it makes the upload fail instead of silently
+  clobbering it. Blobs known to be missing are only created if still missing.
+- JSON blobs are written compact and gzip-compressed with
+  `Content-Encoding: gzip`; readers accept both that and legacy plain JSON.
+"""
+
+import gzip
+import json
+import threading
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+# Generation used for preconditions on blobs that must not exist yet
+MISSING = 0
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def decompress(data: bytes) -> bytes:
+    """Gunzip blob content if it is gzip-compressed, otherwise return it unchanged."""
+    return gzip.decompress(data) if data[:2] == GZIP_MAGIC else data
+
+
+class RunStorage:
+    """Memoizing, precondition-aware reads and writes for one run."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.lock = threading.Lock()
+        self.reads = {}        # name -> bytes, or None if the blob was missing
+        self.generations = {}  # name -> generation seen/written this run
+        self.downloads = 0
+        self.uploads = 0
+
+    # ---------------------- READS ----------------------
+
+    def read_bytes(self, name: str) -> bytes:
+        """Blob content, downloaded at most once per run. Raises NotFound."""
+        with self.lock:
+            if name in self.reads:
+                if self.reads[name] is None:
+                    raise NotFound(f"{name} (cached)")
+                return self.reads[name]
+
+        blob = self.bucket.blob(name)
+        try:
+            # Raw bytes as stored; gzip blobs are decompressed by the readers
+            data = blob.download_as_bytes(raw_download=True)
+        except NotFound:
+            with self.lock:
+                self.reads[name] = None
+                self.generations[name] = MISSING
+            raise
+
+        with self.lock:
+            self.reads[name] = data
+            self.generations[name] = blob.generation
+            self.downloads += 1
+
+        return data
+
+    def read_text(self, name: str) -> str:
+        return decompress(self.read_bytes(name)).decode('utf-8')
+
+    def read_json(self, name: str):
+        """Parse a JSON blob, gzip-compressed or plain. Raises NotFound."""
+        return json.loads(decompress(self.read_bytes(name)))
+
+    def exists(self, name: str) -> bool:
+        try:
+            self.read_bytes(name)
+            return True
+        except NotFound:
+            return False
+
+    def current_generation(self, name: str):
+        """Generation of the blob in the bucket right now (MISSING if absent); metadata only, not memoized."""
+        blob = self.bucket.blob(name)
+        try:
+            blob.reload()
+        except NotFound:
+            return MISSING
+        return blob.generation
+
+    def generation(self, name: str):
+        """Generation of the blob as last seen this run (None if never seen)."""
+        with self.lock:
+            return self.generations.get(name)
+
+    # ---------------------- WRITES ----------------------
+
+    def write(self, name: str, data, content_type: str, content_encoding: str = None,
+              if_generation_match=None):
+        """
+        Upload a blob and refresh the run cache with it.
+        The precondition defaults to the generation seen earlier in the run;
+        pass `if_generation_match` to override (e.g. MISSING for new blobs).
+        Raises google.api_core.exceptions.PreconditionFailed on a lost race; the
+        blob is then forgotten, so the next read fetches the winning copy.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        if if_generation_match is None:
+            if_generation_match = self.generation(name)
+
+        blob = self.bucket.blob(name)
+        if content_encoding:
+            blob.content_encoding = content_encoding
+
+        kwargs = {} if if_generation_match is None else {'if_generation_match': if_generation_match}
+        try:
+            blob.upload_from_string(data, content_type=content_type, **kwargs)
+        except PreconditionFailed:
+            with self.lock:
+                self.reads.pop(name, None)
+                self.generations.pop(name, None)
+            raise
+
+        with self.lock:
+            self.reads[name] = data
+            self.generations[name] = blob.generation
+            self.uploads += 1
+
+    def write_json(self, name: str, payload, compress: bool = True, **kwargs):
+        """
+        Write a JSON blob, compact and (by default) gzip-compressed.
+        `payload` is either an object to serialize or an already-serialized string.
+        """
+        if not isinstance(payload, str):
+            payload = json.dumps(payload, separators=(',', ':'))
+
+        data = payload.encode('utf-8')
+        if compress:
+            # mtime=0 keeps identical payloads byte-identical
+            self.write(name, gzip.compress(data, mtime=0), content_type='application/json',
+                       content_encoding='gzip', **kwargs)
+        else:
+            self.write(name, data, content_type='application/json', **kwargs)
+
+    def stats(self) -> dict:
+        return {'downloads': self.downloads, 'uploads': self.uploads, 'blobs_seen': len(self.reads)}
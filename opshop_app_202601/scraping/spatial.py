@@ -0,0 +1,146 @@
+"""
+Spatial checks across all chains: co-located stores and coordinate outliers.
+
+Stores are hashed into a grid of cells at least the search radius wide (an
+equirectangular projection with longitude scaled at the data's highest
+latitude), so any two stores within the radius sit in the same or adjacent
+cells. Candidate pairs come from joining each
+cell with its 3x3 neighbourhood and are confirmed with the haversine
+distance. The cost grows with stores plus nearby pairs, never n^2.
+
+Added columns:
+- Colocated: another store (any chain) lies within COLOCATED_RADIUS_M
+- ColocatedWith: comma-separated StoreIDs of those stores
+- CoordinateOutlier: coordinates outside Australia, or outside the bounding
+  box of the state named in the address
+"""
+
+import numpy as np
+import pandas as pd
+
+from gazetteer import STATES
+
+EARTH_RADIUS_M = 6_371_000
+
+# Stores closer than this are treated as the same site
+COLOCATED_RADIUS_M = 100
+
+# (min lat, max lat, min lon, max lon); generous boxes, islands excluded
+AUSTRALIA_BOUNDS = (-44.0, -9.0, 112.0, 154.0)
+STATE_BOUNDS = {
+    'act': (-35.95, -35.10, 148.75, 149.40),
+    'nsw': (-37.60, -28.10, 140.90, 153.70),
+    'nt': (-26.05, -10.90, 128.95, 138.05),
+    'qld': (-29.20, -9.10, 137.95, 153.60),
+    'sa': (-38.10, -25.95, 128.95, 141.05),
+    'tas': (-43.70, -39.50, 143.80, 148.50),
+    'vic': (-39.20, -33.95, 140.95, 150.00),
+    'wa': (-35.20, -13.60, 112.90, 129.05),
+}
+
+# Slack around the boxes, in degrees
+BOUNDS_MARGIN = 0.1
+
+# State abbreviation at the end of an address ('... Belconnen ACT 2617[, Australia]')
+ADDRESS_STATE_RE = r'\b(' + '|'.join(STATES) + r')\b\s*(?:\d{4})?\s*(?:,\s*australia)?\s*$'
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+# ---------------------- CO-LOCATION ----------------------
+
+def grid_cells(lat: np.ndarray, lon: np.ndarray, radius_m: float) -> tuple:
+    """
+    Integer (x, y) grid cell of each point for cells at least `radius_m` wide.
+    Longitude is scaled by one reference latitude for all points (the one
+    farthest from the equator), so cell columns line up across latitudes and
+    a column is never narrower than `radius_m` anywhere in the data.
+    """
+    ref_lat = min(float(np.abs(lat).max()), 89.9) if len(lat) else 0.0
+    y = np.radians(lat) * EARTH_RADIUS_M
+    x = np.radians(lon) * EARTH_RADIUS_M * np.cos(np.radians(ref_lat))
+    return np.floor(x / radius_m).astype(np.int64), np.floor(y / radius_m).astype(np.int64)
+
+
+def nearby_pairs(lat: np.ndarray, lon: np.ndarray, radius_m: float = COLOCATED_RADIUS_M) -> pd.DataFrame:
+    """
+    All pairs (i, j), i < j, of points within `radius_m` of each other.
+    Points with missing coordinates are skipped.
+    """
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    idx = np.flatnonzero(valid)
+    cx, cy = grid_cells(lat[valid], lon[valid], radius_m)
+    points = pd.DataFrame({'i': idx, 'cx': cx, 'cy': cy})
+
+    # Cells are at least radius wide, so neighbours are in the 3x3 neighbourhood
+    candidates = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            shifted = points.assign(cx=points['cx'] + dx, cy=points['cy'] + dy).rename(columns={'i': 'j'})
+            pairs = points.merge(shifted, on=['cx', 'cy'])
+            candidates.append(pairs[pairs['i'] < pairs['j']][['i', 'j']])
+
+    pairs = pd.concat(candidates, ignore_index=True).drop_duplicates()
+    distance = haversine_m(lat[pairs['i']], lon[pairs['i']], lat[pairs['j']], lon[pairs['j']])
+
+    return pairs[distance <= radius_m].assign(distance_m=distance[distance <= radius_m]).reset_index(drop=True)
+
+
+# ---------------------- OUTLIERS ----------------------
+
+def in_bounds(lat: np.ndarray, lon: np.ndarray, bounds: tuple, margin: float = BOUNDS_MARGIN) -> np.ndarray:
+    min_lat, max_lat, min_lon, max_lon = bounds
+    return (
+        (lat >= min_lat - margin) & (lat <= max_lat + margin)
+        & (lon >= min_lon - margin) & (lon <= max_lon + margin)
+    )
+
+
+def coordinate_outliers(lat: np.ndarray, lon: np.ndarray, states: pd.Series) -> np.ndarray:
+    """True where coordinates fall outside Australia or outside the address's state."""
+    has_coords = ~(np.isnan(lat) | np.isnan(lon))
+    outlier = has_coords & ~in_bounds(lat, lon, AUSTRALIA_BOUNDS)
+
+    states = states.to_numpy()
+    for state, bounds in STATE_BOUNDS.items():
+        rows = has_coords & (states == state)
+        outlier[rows] |= ~in_bounds(lat[rows], lon[rows], bounds)
+
+    return outlier
+
+
+# ---------------------- PIPELINE ----------------------
+
+def add_spatial_flags(data: pd.DataFrame, radius_m: float = COLOCATED_RADIUS_M) -> pd.DataFrame:
+    """Add Colocated, ColocatedWith and CoordinateOutlier columns."""
+    lat = pd.to_numeric(data['Latitude'], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(data['Longitude'], errors='coerce').to_numpy(dtype=float)
+    ids = data['StoreID'].astype(str).to_numpy()
+
+    pairs = nearby_pairs(lat, lon, radius_m)
+
+    # Both directions, so each store lists every neighbour
+    both = pd.concat([
+        pd.DataFrame({'row': pairs['i'], 'other': ids[pairs['j']]}),
+        pd.DataFrame({'row': pairs['j'], 'other': ids[pairs['i']]}),
+    ])
+    neighbours = both.groupby('row')['other'].agg(lambda s: ', '.join(sorted(s)))
+
+    colocated_with = np.full(len(data), '', dtype=object)
+    colocated_with[neighbours.index.to_numpy()] = neighbours.to_numpy()
+
+    states = data['Address'].fillna('').astype(str).str.lower().str.extract(ADDRESS_STATE_RE, expand=False)
+
+    data = data.copy()
+    data['Colocated'] = colocated_with != ''
+    data['ColocatedWith'] = colocated_with
+    data['CoordinateOutlier'] = coordinate_outliers(lat, lon, states)
+
+    print(f"Spatial flags: {int(data['Colocated'].sum())} co-located stores, "
+          f"{int(data['CoordinateOutlier'].sum())} coordinate outliers")
+
+    return data